@@ -7,56 +7,366 @@ __author__ = 'Michael Zaglada'
 __email__ = "zmpbox@gmail.com"
 __license__ = 'MIT'
 
+import collections
+import contextlib
+import hashlib
 import json
+import re
+import threading
+import time
 import requests
+from multiprocessing.pool import ThreadPool
+
+try:
+    from urllib import urlencode
+except ImportError:
+    from urllib.parse import urlencode
+
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+
+try:
+    from inspect import getfullargspec as getargspec
+except ImportError:
+    from inspect import getargspec
+
+from pycloudflare_v4.concurrency import AdaptiveLimiter, CircuitBreaker, PageSizer, INTERACTIVE, BATCH
+from pycloudflare_v4.index import RecordIndex
+from pycloudflare_v4.plan import Plan
+from pycloudflare_v4.profiling import Profiler, TimedHTTPAdapter, take_connect_time
+from pycloudflare_v4.streaming import StreamingEnvelope
 
 cf_api_url = "https://api.cloudflare.com/client/v4/"
 
+try:
+    from requests.packages.urllib3.response import HTTPResponse
+    # brotli is only announced when urllib3 can decode it, i.e. the brotli package is installed
+    accept_encoding = ", ".join(e for e in ["br", "gzip", "deflate"] if e in HTTPResponse.CONTENT_DECODERS)
+except (ImportError, AttributeError):
+    accept_encoding = "gzip, deflate"
+
+
+def listing_endpoint(uri):
+    """
+    "zones/<id>/dns_records?type=A" -> "dns_records"
+    """
+    return uri.split('?', 1)[0].rstrip('/').rsplit('/', 1)[-1]
+
 
 class CloudFlare(object):
-    def __init__(self, email, token):
+    def __init__(self, email, token, limiter=None, breaker=None, rate_limiter=None,
+                 timeout=(10, 60), deadline=None, hedge=False, cache=None, base_url=None, profiler=None,
+                 page_sizer=None):
+        """
+        :param email:
+        :param token:
+        :param limiter: AdaptiveLimiter, bounds in-flight requests
+        :param breaker: CircuitBreaker
+        :param rate_limiter: RateLimiter, request budget of the account; unlimited if None
+        :param timeout: (connect, read) timeout of a single request, seconds
+        :param deadline: overall time limit of paginated and bulk operations, seconds
+        :param hedge: resend GETs slower than the p95 of recent GETs and use the first response
+        :param cache: SharedCache for zone lists, zone settings, DNS records and CloudFlare IPs
+        :param base_url: API endpoint, cf_api_url by default; e.g. a local cfv4-proxy
+        :param profiler: Profiler, see profile()
+        :param page_sizer: PageSizer, tunes per_page of paginated listings
+        """
         self.EMAIL = email
         self.TOKEN = token
+        self.limiter = limiter or AdaptiveLimiter()
+        self.breaker = breaker or CircuitBreaker()
+        self.rate_limiter = rate_limiter
+        self.timeout = timeout
+        self.deadline = deadline
+        self.hedge = hedge
+        self._get_latencies = collections.deque(maxlen=200)
+        self.indexes = {}
+        self._local = threading.local()
+        self.cache = cache
+        self.base_url = base_url or cf_api_url
+        self.profiler = profiler
+        self.page_sizer = page_sizer or PageSizer(latency_target=self.limiter.latency_target / 2.0)
+        self.session = requests.Session()
+        adapter = TimedHTTPAdapter(pool_maxsize=self.limiter.maximum)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
 
     class CONNError(Exception):
         pass
 
+    class TIMEOUTError(CONNError):
+        pass
+
     class APIError(Exception):
         pass
 
     class WRAPPERError(Exception):
         pass
 
-    def api_call_get(self, url, data=None):
-        headers = {'X-Auth-Email': self.EMAIL, 'X-Auth-Key': self.TOKEN, 'Content-Type': 'application/json'}
+    def api_call(self, method, uri, data=None, expires=None, stream=False):
+        """
+        Sends a single request through the circuit breaker, the concurrency limiter and the rate
+        limiter, if any; both serve interactive requests before batch ones. With hedging enabled,
+        a GET slower than the p95 of recent GETs is sent once more and whichever response comes
+        first is used.
+        :param method: HTTP method
+        :param uri: path relative to the client's base_url
+        :param data: request body, will be JSON-encoded
+        :param expires: absolute time (time.time()) after which the call must not run
+        :param stream: don't read the body yet, see requests' stream argument
+        :return: requests.Response
+        """
+        if expires is not None and time.time() >= expires:
+            raise self.CONNError('Deadline exceeded.')
+        plan = self.plan
+        if plan is not None and method != 'GET':
+            plan.record(method, uri)  # planned writes aren't sent, so they don't go through the breaker
+            return self._dry_run_response(data)
+        if not self.breaker.allow():
+            raise self.CONNError('Circuit breaker is open, CloudFlare API looks degraded.')
         try:
-            r = requests.get(cf_api_url + url, data=json.dumps(data), headers=headers)
+            if plan is not None:
+                plan.record(method, uri)
+            if method == 'GET' and self.hedge and not stream:
+                delay = self.hedge_delay()
+                if delay is not None:
+                    return self._hedged_send(uri, data, expires, delay)
+            r = self._send(method, uri, data, expires, stream)
+        finally:
+            self.breaker.cancel_trial()  # in case nothing was sent
+        if method != 'GET' and self.cache is not None:
+            self._invalidate(uri)
+        return r
+
+    def _cached(self, key, loader):
+        if self.cache is None:
+            return loader()
+        return self.cache.get(key, loader)
+
+    def _invalidate(self, uri):
+        """
+        Drops the cache entries a write to uri makes stale.
+        """
+        match = re.match(r'zones/([^/?]+)/(dns_records|settings)', uri)
+        if match:
+            self.cache.invalidate(match.group(2) + "-" + match.group(1))
+            if match.group(2) == "dns_records":
+                self.cache.invalidate("all_dns_records-" + match.group(1))
+
+    def _send(self, method, uri, data, expires, stream=False):
+        if expires is not None and time.time() >= expires:
+            raise self.CONNError('Deadline exceeded.')
+
+        headers = {'X-Auth-Email': self.EMAIL, 'X-Auth-Key': self.TOKEN, 'Content-Type': 'application/json',
+                   'Accept-Encoding': accept_encoding}
+        self.limiter.acquire(self.current_priority(), self.rate_limiter)
+
+        #  Waiting for the limiters may have used up the time left
+        connect_timeout, read_timeout = self.timeout
+        if expires is not None:
+            remaining = expires - time.time()
+            if remaining <= 0:
+                self.limiter.cancel()
+                raise self.CONNError('Deadline exceeded.')
+            connect_timeout = min(connect_timeout, remaining)
+            read_timeout = min(read_timeout, remaining)
+        if self.profiler is not None:
+            take_connect_time()  # drop what earlier, unprofiled requests of this thread spent connecting
+        token = time.time()
+        try:
+            r = self.session.request(method, self.base_url + uri, data=json.dumps(data), headers=headers,
+                                     timeout=(connect_timeout, read_timeout), stream=stream)
+        except requests.Timeout as e:
+            self.limiter.release(token, error=True)
+            self.breaker.record_failure()
+            raise self.TIMEOUTError(str(e))
         except (requests.ConnectionError,
                 requests.RequestException,
                 requests.HTTPError,
                 requests.Timeout,
                 requests.TooManyRedirects) as e:
+            self.limiter.release(token, error=True)
+            self.breaker.record_failure()
             raise self.CONNError(str(e))
+        self.limiter.release(token, status=r.status_code)
+        r.request_time = time.time() - token  # without the time spent queueing for the limiters
+        if self.profiler is not None:
+            total = time.time() - token
+            connect = take_connect_time()
+            headers = r.elapsed.total_seconds()
+            self.profiler.record("connect", connect, request=True)
+            self.profiler.record("wait", max(0.0, headers - connect))
+            if not stream:
+                self.profiler.record("download", max(0.0, total - headers))
+        if r.status_code >= 500:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+            if method == 'GET':
+                self._get_latencies.append(time.time() - token)
+        return r
+
+    def decode(self, r):
+        """
+        :param r: requests.Response
+        :return: decoded JSON body
+        """
+        if self.profiler is None:
+            return json.loads(r.content)
+        started = time.time()
+        try:
+            return json.loads(r.content)
+        finally:
+            self.profiler.record("decode", time.time() - started)
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """
+        Accounts the time spent in the block to a profiling phase, if profiling.
+        """
+        if self.profiler is None:
+            yield
+            return
+        started = time.time()
         try:
-            api_result = json.loads(r.text)
+            yield
+        finally:
+            self.profiler.record(name, time.time() - started)
+
+    @contextlib.contextmanager
+    def profile(self, name):
+        """
+        Profiles the calls made inside the block as one operation: wall time, time per phase
+        (connect, wait, download, decode, post-process) and peak memory allocated.
+
+            with cfapi.profile("dns walk"):
+                cfapi.dns_records(zone_id)
+            print(cfapi.profiler.report())
+
+        :param name: operation name shown in the report
+        :return: Operation
+        """
+        if self.profiler is None:
+            self.profiler = Profiler()
+        op = self.profiler.start(name)
+        try:
+            yield op
+        finally:
+            self.profiler.finish(op)
+
+    @contextlib.contextmanager
+    def dry_run(self):
+        """
+        Counts the API calls made inside the block without sending any write; reads are still sent,
+        so pagination is counted as well. Writes get a successful response echoing their data.
+        Applies to the calling thread and to the work it fans out with parallel_map(); other
+        threads using this client keep writing for real.
+
+            with cfapi.dry_run() as plan:
+                cfapi.dns_records_bulk(operations)
+            print(plan.summary())
+
+        :return: Plan
+        """
+        plan = Plan()
+        try:
+            with self._in_plan(plan):
+                yield plan
+        finally:
+            plan.observe(self)
+
+    @property
+    def plan(self):
+        """
+        Plan of the dry run the calling thread is in, or None.
+        """
+        return getattr(self._local, 'plan', None)
+
+    @contextlib.contextmanager
+    def _in_plan(self, plan):
+        previous = getattr(self._local, 'plan', None)
+        self._local.plan = plan
+        try:
+            yield
+        finally:
+            self._local.plan = previous
+
+    def _dry_run_response(self, data):
+        r = requests.models.Response()
+        r.status_code = 200
+        r._content = json.dumps({"success": True, "errors": [], "messages": [], "result": data}).encode('utf-8')
+        return r
+
+    def hedge_delay(self):
+        """
+        :return: p95 of recent GET latencies, or None while there are too few samples
+        """
+        samples = sorted(self._get_latencies)
+        if len(samples) < 20:
+            return None
+        return samples[int(len(samples) * 0.95)]
+
+    def _hedged_send(self, uri, data, expires, delay):
+        responses = queue.Queue()
+        priority = self.current_priority()
+
+        def attempt():
+            try:
+                with self.priority(priority):
+                    responses.put((True, self._send('GET', uri, data, expires)))
+            except Exception as e:
+                responses.put((False, e))
+
+        for n in range(2):
+            t = threading.Thread(target=attempt)
+            t.daemon = True
+            t.start()
+            if n == 0:
+                try:
+                    ok, value = responses.get(timeout=delay)
+                except queue.Empty:
+                    continue
+                if ok:
+                    return value
+                raise value
+
+        ok, value = responses.get()
+        if not ok:
+            ok, value = responses.get()
+        if ok:
+            return value
+        raise value
+
+    def api_call_get(self, url, data=None, expires=None):
+        r = self.api_call('GET', url, data, expires)
+        try:
+            api_result = self.decode(r)
         except ValueError:
             raise self.APIError('JSON parse failed.')
         if api_result['result'] == 'error':
             raise self.APIError(api_result['msg'])
         return api_result
 
+    def api_call_get_stream(self, url, expires=None):
+        """
+        GET whose body is parsed while it downloads.
+        :return: StreamingEnvelope, iterate its items() to get the result items
+        """
+        r = self.api_call('GET', url, expires=expires, stream=True)
+        if r.status_code >= 400:
+            try:
+                api_result = self.decode(r)
+            except ValueError:
+                raise self.APIError('JSON parse failed.')
+            raise self.APIError(str(api_result.get('errors')))
+        return StreamingEnvelope(r.iter_content(65536))
+
     def api_call_post(self, url, data=None):
-        headers = {'X-Auth-Email': self.EMAIL, 'X-Auth-Key': self.TOKEN, 'Content-Type': 'application/json'}
+        r = self.api_call('POST', url, data)
         try:
-            r = requests.post(cf_api_url + url, data=json.dumps(data), headers=headers)
-        except (requests.ConnectionError,
-                requests.RequestException,
-                requests.HTTPError,
-                requests.Timeout,
-                requests.TooManyRedirects) as e:
-            raise self.CONNError(str(e))
-        try:
-            api_result = json.loads(r.text)
+            api_result = self.decode(r)
         except ValueError:
             raise self.APIError('JSON parse failed.')
         if api_result['result'] == 'error':
@@ -64,35 +374,19 @@ class CloudFlare(object):
         return api_result
 
     def api_call_delete(self, uri, data='{}'):
-        headers = {'X-Auth-Email': self.EMAIL, 'X-Auth-Key': self.TOKEN, 'Content-Type': 'application/json'}
+        r = self.api_call('DELETE', uri, data)
         try:
-            r = requests.delete(cf_api_url + uri, data=json.dumps(data), headers=headers)
-        except (requests.ConnectionError,
-                requests.RequestException,
-                requests.HTTPError,
-                requests.Timeout,
-                requests.TooManyRedirects) as e:
-            raise self.CONNError(str(e))
-        try:
-            api_result = json.loads(r.text)
+            api_result = self.decode(r)
         except ValueError:
             raise self.APIError('JSON parse failed.')
         if not api_result['success']:
             raise self.APIError(api_result['errors'])
         return api_result
 
-    def api_call_patch(self, uri, data='{}'):
-        headers = {'X-Auth-Email': self.EMAIL, 'X-Auth-Key': self.TOKEN, 'Content-Type': 'application/json'}
-        try:
-            r = requests.patch(cf_api_url + uri, data=json.dumps(data), headers=headers)
-        except (requests.ConnectionError,
-                requests.RequestException,
-                requests.HTTPError,
-                requests.Timeout,
-                requests.TooManyRedirects) as e:
-            raise self.CONNError(str(e))
+    def api_call_patch(self, uri, data='{}', expires=None):
+        r = self.api_call('PATCH', uri, data, expires)
         try:
-            api_result = json.loads(r.text)
+            api_result = self.decode(r)
         except ValueError:
             raise self.APIError('JSON parse failed.')
         if api_result['result'] == 'error':
@@ -100,17 +394,9 @@ class CloudFlare(object):
         return api_result
 
     def api_call_put(self, uri, data='{}'):
-        headers = {'X-Auth-Email': self.EMAIL, 'X-Auth-Key': self.TOKEN, 'Content-Type': 'application/json'}
+        r = self.api_call('PUT', uri, data)
         try:
-            r = requests.put(cf_api_url + uri, data=json.dumps(data), headers=headers)
-        except (requests.ConnectionError,
-                requests.RequestException,
-                requests.HTTPError,
-                requests.Timeout,
-                requests.TooManyRedirects) as e:
-            raise self.CONNError(str(e))
-        try:
-            api_result = json.loads(r.text)
+            api_result = self.decode(r)
         except ValueError:
             raise self.APIError('JSON parse failed.')
         if api_result['result'] == 'error':
@@ -119,6 +405,160 @@ class CloudFlare(object):
             raise self.APIError(str(api_result['errors']))
         return api_result
 
+    def expires(self):
+        """
+        :return: absolute expiry time of an operation starting now, or None without a deadline
+        """
+        if self.deadline is None:
+            return None
+        return time.time() + self.deadline
+
+    @contextlib.contextmanager
+    def priority(self, priority):
+        """
+        Sets the scheduling class of the calls made by this thread inside the block:
+
+            with cfapi.priority(BATCH):
+                ...
+
+        :param priority: pycloudflare_v4.concurrency.INTERACTIVE or BATCH
+        """
+        previous = getattr(self._local, 'priority', None)
+        self._local.priority = priority
+        try:
+            yield
+        finally:
+            self._local.priority = previous
+
+    def current_priority(self):
+        """
+        :return: scheduling class of this thread, INTERACTIVE unless set by priority()
+        """
+        priority = getattr(self._local, 'priority', None)
+        return INTERACTIVE if priority is None else priority
+
+    def with_context(self, func):
+        """
+        Binds func to the calling thread's priority and dry run, for running it on threads
+        started elsewhere, e.g. a ThreadPool of the caller's own.
+        :param func:
+        :return: function taking the same arguments
+        """
+        priority = getattr(self._local, 'priority', None)
+        plan = self.plan
+
+        def run(*args, **kwargs):
+            with self.priority(priority), self._in_plan(plan):
+                return func(*args, **kwargs)
+        return run
+
+    def parallel_map(self, func, items):
+        """
+        Applies func to every item on a thread pool and returns the results in order.
+        The pool is sized to the limiter's maximum; the limiter itself decides how many
+        of those threads actually have a request in flight.
+        Fanned-out work runs with the caller's priority, so the pages of an interactive
+        listing stay interactive. Batch entry points such as dns_records_bulk() set BATCH.
+        :param func:
+        :param items:
+        :return: list
+        """
+        run = self.with_context(func)
+
+        items = list(items)
+        if len(items) < 2:
+            return [run(i) for i in items]
+        pool = ThreadPool(min(len(items), self.limiter.maximum))
+        try:
+            return pool.map(run, items)
+        finally:
+            pool.close()
+            pool.join()
+
+    def paginate(self, uris, per_page=None):
+        """
+        Fetches every page of one or more listings. First pages go out together to learn
+        total_pages, then all remaining pages are fetched concurrently.
+        The whole listing must finish within the client's deadline, if one is set.
+        :param uris: list of listing URIs of the same endpoint, may already contain a query string
+        :param per_page: page size, chosen by the client's PageSizer if None
+        :return: list of result items, in listing and page order
+        """
+        expires = self.expires()
+        endpoint = listing_endpoint(uris[0]) if uris else None
+        if per_page is None:
+            per_page = self.page_sizer.size(endpoint)
+
+        def fetch(args):
+            uri, page = args
+            sep = '&' if '?' in uri else '?'
+            try:
+                r = self.api_call('GET', "{0}{1}page={2}&per_page={3}".format(uri, sep, page, per_page), expires=expires)
+            except self.TIMEOUTError:
+                self.page_sizer.failed(endpoint)
+                raise
+            if r.status_code >= 500:
+                self.page_sizer.failed(endpoint)
+            try:
+                response = self.decode(r)
+            except ValueError:
+                raise self.APIError('JSON parse failed.')
+            if not response['success']:
+                raise self.APIError(str(response['errors']))
+            self.page_sizer.observe(endpoint, len(response['result']), len(r.content), r.request_time)
+            return response
+
+        try:
+            first_pages = self.parallel_map(fetch, [(uri, 1) for uri in uris])
+        except BaseException as e:
+            raise self.APIError(str(e))
+
+        rest = []
+        for uri, first in zip(uris, first_pages):
+            for page in range(2, first['result_info']['total_pages'] + 1):
+                rest.append((uri, page))
+        rest_pages = iter(self.parallel_map(fetch, rest))
+
+        with self.phase("post-process"):
+            items = []
+            for first in first_pages:
+                items.extend(first['result'])
+                for _ in range(1, first['result_info']['total_pages']):
+                    items.extend(next(rest_pages)['result'])
+        return items
+
+    def iter_listing(self, uri, per_page=None):
+        """
+        Yields the items of a listing while they are being downloaded, page by page. Unlike paginate(),
+        memory use doesn't grow with per_page or with the size of the listing.
+        :param uri: listing URI, may already contain a query string
+        :param per_page: page size, chosen by the client's PageSizer if None
+        :return: generator
+        """
+        expires = self.expires()
+        if per_page is None:
+            per_page = self.page_sizer.size(listing_endpoint(uri))
+        sep = '&' if '?' in uri else '?'
+        page, pages = 1, 1
+        while page <= pages:
+            response = self.api_call_get_stream("{0}{1}page={2}&per_page={3}".format(uri, sep, page, per_page),
+                                                expires=expires)
+            items = response.items()
+            while True:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    break
+                except ValueError:
+                    raise self.APIError('JSON parse failed.')
+                except requests.RequestException as e:
+                    raise self.CONNError(str(e))
+                yield item
+            if not response.envelope.get('success'):
+                raise self.APIError(str(response.envelope.get('errors')))
+            pages = response.envelope['result_info']['total_pages']
+            page += 1
+
     ################################################################
     #  Zone (https://api.cloudflare.com/#zone)                     #
     ################################################################
@@ -130,22 +570,16 @@ class CloudFlare(object):
         including zone ID which is used for any other operations.
         :return: dict
         """
-        all_zones = {}
-        try:
-            intermediate_result = self.api_call_get("zones&per_page=50")
-        except BaseException as e:
-            raise self.APIError(str(e))
-
-        pages = intermediate_result['result_info']['total_pages']
-        for p in range(1, (pages+1)):
-            zones = self.api_call_get("zones&page={0}&per_page=50".format(p))
-            if zones['success']:
-                for i in zones['result']:
+        def load():
+            all_zones = {}
+            zones = self.paginate(["zones"])
+            with self.phase("post-process"):
+                for i in zones:
                     all_zones[i['name']] = i
-            else:
-                raise self.APIError(str(zones['errors']))
+            return all_zones
 
-        return all_zones
+        account = hashlib.sha1(self.EMAIL.encode('utf-8')).hexdigest()[:12]
+        return self._cached("zones-" + account, load)
 
     # Purge all cache for the zone
     def purge_everything(self, zone_id):
@@ -169,12 +603,16 @@ class CloudFlare(object):
         :param zone_id:
         :return:
         """
-        result = {}
-        response = self.api_call_get("zones/" + str(zone_id) + "/settings")
-        if response['success']:
-            for i in response['result']:
-                result[i['id']] = i
-        return result
+        def load():
+            result = {}
+            response = self.api_call_get("zones/" + str(zone_id) + "/settings")
+            if response['success']:
+                with self.phase("post-process"):
+                    for i in response['result']:
+                        result[i['id']] = i
+            return result
+
+        return self._cached("settings-" + str(zone_id), load)
 
     def change_always_online_setting(self, zone_id, always_online):
         """
@@ -969,32 +1407,65 @@ class CloudFlare(object):
         :return: list
         """
         record_types = ["A", "AAAA", "CNAME", "TXT", "SRV", "LOC", "MX", "NS", "SPF"]  # all available record types
-        records = []
-        record_types_pages = {}
+        uris = ["zones/" + str(zone_id) + "/dns_records?type={type}".format(type=record_type)
+                for record_type in record_types]
+        return self._cached("dns_records-" + str(zone_id), lambda: self.paginate(uris))
 
-        for record_type in record_types:
-            """Get the number of pages for each record type"""
-            uri_get_pages = "zones/" + str(zone_id) + "/dns_records?type={type}&per_page=100".format(type=record_type)
-            try:
-                intermediate_result = self.api_call_get(uri_get_pages)
-            except BaseException as e:
-                raise self.APIError(str(e))
-
-            record_types_pages[record_type] = intermediate_result['result_info']['total_pages']
-
-        for record_type in record_types:
-            for page in range(1, (record_types_pages[record_type] + 1)):
-                uri = "zones/" + str(zone_id) + "/dns_records?type={type}&page={page}&per_page=100".format(
-                    type=record_type,
-                    page=page)
-
-                dns_records = self.api_call_get(uri)
-                if dns_records['success']:
-                    for i in dns_records['result']:
-                        records.append(i)
-                else:
-                    raise self.APIError(str(dns_records['errors']))
-        return records
+    def all_dns_records(self, zone_id):
+        """
+        Every record of the zone, whatever its type; dns_records() only returns the types it lists.
+        :param zone_id:
+        :return: list
+        """
+        uri = "zones/" + str(zone_id) + "/dns_records"
+        return self._cached("all_dns_records-" + str(zone_id), lambda: self.paginate([uri]))
+
+    def iter_dns_records(self, zone_id, per_page=None):
+        """
+        Same records as all_dns_records(), i.e. of every type, unlike dns_records(), but yielded
+        one by one while pages are streaming in.
+        :param zone_id:
+        :param per_page: page size, chosen by the client's PageSizer if None
+        :return: generator
+        """
+        return self.iter_listing("zones/" + str(zone_id) + "/dns_records", per_page)
+
+    def find_dns_records(self, zone_id, name=None, type=None, content=None, proxied=None,
+                         match="all", order=None, direction=None):
+        """
+        https://api.cloudflare.com/#dns-records-for-a-zone-list-dns-records
+        Same as dns_records(), but filtering is done by the API, so only matching records are paginated.
+        :param zone_id:
+        :param name: full record name, e.g. "www.example.com"
+        :param type:
+        :param content:
+        :param proxied: True/False or "true"/"false"
+        :param match: "all" - record must match every filter, "any" - at least one
+        :param order: "type", "name", "content", "ttl" or "proxied"
+        :param direction: "asc" or "desc"
+        :return: list
+        """
+        valid_values_match = ["all", "any"]
+        valid_values_order = [None, "type", "name", "content", "ttl", "proxied"]
+        valid_values_direction = [None, "asc", "desc"]
+
+        if match not in valid_values_match:
+            raise self.WRAPPERError('valid values: {0}'.format(valid_values_match))
+        if order not in valid_values_order:
+            raise self.WRAPPERError('valid values: {0}'.format(valid_values_order))
+        if direction not in valid_values_direction:
+            raise self.WRAPPERError('valid values: {0}'.format(valid_values_direction))
+
+        params = [("match", match)]
+        for key, value in [("name", name), ("type", type), ("content", content),
+                           ("order", order), ("direction", direction)]:
+            if value is not None:
+                params.append((key, value))
+        if proxied is not None:
+            params.append(("proxied", str(proxied).lower()))
+
+        uri = "zones/" + str(zone_id) + "/dns_records?" + urlencode(params)
+        return self.paginate([uri])
 
     def dns_records_create(self, zone_id, record_type, record_name, record_content, record_ttl=1, record_proxied=False,
                            record_priority=False):
@@ -1029,6 +1500,7 @@ class CloudFlare(object):
         create_record = self.api_call_post(uri, data)
 
         if create_record['success']:
+            self._index_record(zone_id, create_record['result'])
             return create_record['result']
         else:
             raise self.APIError(str(create_record['errors']))
@@ -1064,19 +1536,18 @@ class CloudFlare(object):
         change_list['ttl'] = ttl
         change_list['priority'] = priority
 
-        #  First, fetch data for the record
-        for i in self.dns_records(zone_id):
-            if i['id'] == record_id:
-                original_data = i
-
-        data = original_data
-
-        for k, v in change_list.iteritems():
+        #  Only the changed fields are sent, so changes made meanwhile by others are kept
+        data = dict()
+        for k, v in change_list.items():
             if k == 'proxied' and v:
                 data[k] = json.loads(v)  # escape for true/false in proxied settings
             elif v:
                 data[k] = v
-        return self.api_call_put(uri, data)
+        update_record = self.api_call_patch(uri, data)
+        if not update_record['success']:
+            raise self.APIError(str(update_record['errors']))
+        self._index_record(zone_id, update_record['result'])
+        return update_record
 
     def dns_records_delete(self, zone_id, record_id):
         """
@@ -1087,14 +1558,174 @@ class CloudFlare(object):
         """
         uri = "zones/" + str(zone_id) + "/dns_records/" + str(record_id)
 
-        return self.api_call_delete(uri, data=False)
+        delete_record = self.api_call_delete(uri, data=False)
+        if zone_id in self.indexes and self.plan is None:
+            self.indexes[zone_id].remove(record_id)
+        return delete_record
+
+    def dns_records_upsert(self, zone_id, record_type, record_name, record_content, record_ttl=1,
+                           record_proxied=False, record_priority=False, match_content=False):
+        """
+        Makes sure a record exists with the given values: creates it if missing, PATCHes only the fields
+        that differ, or does nothing if it's already as asked. Safe to retry and cheap to repeat.
+        The record is looked up in the zone's index (see dns_index()) if there is one, otherwise
+        by a filtered listing. A create that times out or is rejected is looked up again before being
+        retried, so it never leaves a duplicate behind.
+        :param zone_id:
+        :param record_type:
+        :param record_name: full record name, e.g. "www.example.com"
+        :param record_content:
+        :param record_ttl:
+        :param record_proxied:
+        :param record_priority: MX only; an existing record keeps its priority unless one is given
+        :param match_content: False - (name, type) identifies the record and its content gets updated,
+                              True - (name, type, content) does, e.g. for one of several A records of a name
+        :return: dict with "action" ("created", "updated" or "unchanged") and "record"
+        """
+        desired = {"content": record_content,
+                   "ttl": int(record_ttl),
+                   "proxied": str(record_proxied).lower() in ("true", "1")}
+        if record_type == 'MX' and record_priority is not False:
+            desired['priority'] = record_priority  # left as it is unless given
+        criteria = {"name": record_name, "type": record_type}
+        if match_content:
+            criteria["content"] = record_content
+
+        index = self.indexes.get(zone_id)
+        if index is not None:
+            existing = index.find(**criteria)
+        else:
+            existing = self.find_dns_records(zone_id, **criteria)
+
+        for attempt in range(2):
+            if existing:
+                break
+            try:
+                record = self.dns_records_create(zone_id, record_type, record_name, record_content, desired['ttl'],
+                                                 str(desired['proxied']).lower(), record_priority)
+                return {"action": "created", "record": record}
+            except (self.CONNError, self.APIError):
+                #  The create may have gone through anyway, ask the API rather than the index
+                existing = self.find_dns_records(zone_id, **criteria)
+                if not existing and attempt == 1:
+                    raise
+
+        if len(existing) > 1 and not match_content:
+            raise self.WRAPPERError('{0} {1} records named {2}, use match_content=True'.format(
+                len(existing), record_type, record_name))
+        record = sorted(existing, key=lambda r: (r.get('created_on', ''), r['id']))[0]
+
+        changes = dict((k, v) for k, v in desired.items() if record.get(k) != v)
+        if not changes:
+            return {"action": "unchanged", "record": record}
+        uri = "zones/" + str(zone_id) + "/dns_records/" + str(record['id'])
+        response = self.api_call_patch(uri, changes)
+        if not response['success']:
+            raise self.APIError(str(response['errors']))
+        if self.plan is not None:
+            return {"action": "updated", "record": dict(record, **changes)}
+        self._index_record(zone_id, response['result'])
+        return {"action": "updated", "record": response['result']}
+
+    def dns_index(self, zone_id):
+        """
+        Lists all records of the zone into a RecordIndex for local lookups by name, type, content,
+        proxied status and domain suffix. Creates, updates and deletes done by this client
+        keep the index up to date.
+        :param zone_id:
+        :return: RecordIndex
+        """
+        index = RecordIndex(self.paginate(["zones/" + str(zone_id) + "/dns_records"]))
+        self.indexes[zone_id] = index
+        return index
+
+    def _index_record(self, zone_id, record):
+        index = self.indexes.get(zone_id)
+        if index is not None and record and self.plan is None:
+            index.add(record)
+
+    def dns_records_bulk(self, operations, journal=None):
+        """
+        Runs many dns_records_create/update/upsert/delete calls concurrently. Every operation is a dict with
+        "op" ("create", "update", "upsert" or "delete") and the keyword arguments of the matching method, e.g.
+        {"op": "delete", "zone_id": "...", "record_id": "..."}. Upserts can be replayed safely; to avoid
+        a lookup per record, build the zone's index with dns_index() first.
+        With a journal (pycloudflare_v4.journal.Journal) the whole batch is recorded before anything is sent
+        and every outcome as it arrives, so dns_records_bulk_resume() can finish the batch after a crash.
+        Operations with unknown or missing arguments are rejected with WRAPPERError before anything is
+        journaled or sent; any other error of an operation is returned as its "error".
+        :param operations: list of dicts
+        :param journal:
+        :return: list of dicts with "operation" and either "result" or "error", in operations order
+        """
+        methods = self._bulk_methods()
+        for operation in operations:
+            if operation.get("op") not in methods:
+                raise self.WRAPPERError('valid values of "op": {0}'.format(sorted(methods)))
+            #  Reject malformed operations before anything is journaled or sent
+            spec = getargspec(methods[operation["op"]])
+            required = spec.args[1:len(spec.args) - len(spec.defaults or ())]
+            kwargs = set(operation) - set(["op"])
+            if kwargs - set(spec.args[1:]) or set(required) - kwargs:
+                raise self.WRAPPERError('"{0}" takes {1}, requires {2}: {3}'.format(
+                    operation["op"], spec.args[1:], required, operation))
+
+        if journal is not None and self.plan is not None:
+            journal = None  # a dry run must not leave operations to resume
+        if journal is None:
+            entries = [(None, operation) for operation in operations]
+        else:
+            entries = journal.intents(operations)
+        return self._run_bulk(entries, journal)
+
+    def dns_records_bulk_resume(self, journal):
+        """
+        Sends the operations of a journal that haven't completed yet, failed ones included.
+        :param journal:
+        :return: same as dns_records_bulk(), for the replayed operations only
+        """
+        if self.plan is not None:
+            return self._run_bulk(journal.pending(), None)
+        return self._run_bulk(journal.pending(), journal)
+
+    def _bulk_methods(self):
+        return {"create": self.dns_records_create,
+                "update": self.dns_records_update,
+                "upsert": self.dns_records_upsert,
+                "delete": self.dns_records_delete}
+
+    def _run_bulk(self, entries, journal):
+        methods = self._bulk_methods()
+        expires = self.expires()
+
+        def run(entry):
+            seq, operation = entry
+            kwargs = dict(operation)
+            method = methods[kwargs.pop("op")]
+            try:
+                if expires is not None and time.time() >= expires:
+                    raise self.CONNError('Deadline exceeded.')
+                with self.priority(BATCH):
+                    result = method(**kwargs)
+            except Exception as e:  # one bad operation must not lose the results of the others
+                if journal is not None:
+                    journal.failed(seq, str(e))
+                return {"operation": operation, "error": str(e)}
+            if journal is not None:
+                journal.done(seq, result)
+            return {"operation": operation, "result": result}
+
+        return self.parallel_map(run, entries)
 
     ##########################################################################
     # CloudFlare IPs (https://api.cloudflare.com/#cloudflare-ips-properties) #
     ##########################################################################
     def cf_ips(self):
-        uri = "ips"
-        response = self.api_call_get(uri)
-        if response['success']:
-            ips = response['result']
-        return ips
+        def load():
+            uri = "ips"
+            response = self.api_call_get(uri)
+            if response['success']:
+                ips = response['result']
+            return ips
+
+        return self._cached("ips", load)
@@ -0,0 +1,125 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import json
+from array import array
+
+MISSING = -1
+
+
+def collect_settings(cfapi, zone_ids):
+    """
+    Fetches get_all_zone_settings() of every zone concurrently, bounded by the client's limiter.
+    Zones that fail are left out of the matrix and reported in its errors attribute.
+    :param cfapi: CloudFlare
+    :param zone_ids:
+    :return: SettingsMatrix
+    """
+    def fetch(zone_id):
+        try:
+            return zone_id, cfapi.get_all_zone_settings(zone_id), None
+        except (cfapi.CONNError, cfapi.APIError) as e:
+            return zone_id, None, str(e)
+
+    settings_by_zone = {}
+    errors = {}
+    for zone_id, settings, error in cfapi.parallel_map(fetch, zone_ids):
+        if error is None:
+            settings_by_zone[zone_id] = dict((k, v['value']) for k, v in settings.items())
+        else:
+            errors[zone_id] = error
+    matrix = SettingsMatrix(settings_by_zone)
+    matrix.errors = errors
+    return matrix
+
+
+class SettingsMatrix(object):
+    """
+    Zone x setting matrix. Every distinct setting value is stored once in values, and every
+    zone row is an array of indexes into it (MISSING where the zone lacks the setting), so
+    thousands of zones take a few bytes per cell and comparing cells is comparing integers.
+    """
+    def __init__(self, settings_by_zone):
+        """
+        :param settings_by_zone: dict, zone ID -> {setting ID: value}
+        """
+        self.zones = sorted(settings_by_zone)
+        self.settings = sorted(set(s for settings in settings_by_zone.values() for s in settings))
+        self.values = []
+        self.errors = {}
+        self._value_ids = {}
+        self._zone_rows = dict((zone_id, i) for i, zone_id in enumerate(self.zones))
+        self._setting_cols = dict((setting, i) for i, setting in enumerate(self.settings))
+        self.rows = []
+        for zone_id in self.zones:
+            settings = settings_by_zone[zone_id]
+            self.rows.append(array('i', [self._intern(settings[s]) if s in settings else MISSING
+                                         for s in self.settings]))
+
+    def _intern(self, value):
+        key = json.dumps(value, sort_keys=True)
+        if key not in self._value_ids:
+            self._value_ids[key] = len(self.values)
+            self.values.append(value)
+        return self._value_ids[key]
+
+    def _value_id(self, value):
+        return self._value_ids.get(json.dumps(value, sort_keys=True))
+
+    def get(self, zone_id, setting, default=None):
+        col = self._setting_cols.get(setting)
+        if col is None:
+            return default
+        cell = self.rows[self._zone_rows[zone_id]][col]
+        return default if cell == MISSING else self.values[cell]
+
+    def drift(self, baseline):
+        """
+        Compares every zone with a baseline profile.
+        :param baseline: dict, setting ID -> expected value
+        :return: dict, zone ID -> {setting ID: (expected, actual)}, zones without drift are left out;
+                 actual is None if the zone lacks the setting
+        """
+        expected = [(setting, value, self._setting_cols.get(setting), self._value_id(value))
+                    for setting, value in sorted(baseline.items())]
+        report = {}
+        for zone_id, row in zip(self.zones, self.rows):
+            for setting, value, col, value_id in expected:
+                cell = MISSING if col is None else row[col]
+                if cell != value_id or cell == MISSING:
+                    actual = None if cell == MISSING else self.values[cell]
+                    report.setdefault(zone_id, {})[setting] = (value, actual)
+        return report
+
+    def value_counts(self, zone_ids, setting):
+        """
+        :return: dict, JSON-encoded value -> number of zones having it
+        """
+        col = self._setting_cols[setting]
+        counts = {}
+        for zone_id in zone_ids:
+            cell = self.rows[self._zone_rows[zone_id]][col]
+            key = None if cell == MISSING else json.dumps(self.values[cell], sort_keys=True)
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def group_drift(self, groups):
+        """
+        Compares groups of zones with each other, e.g. production vs staging.
+        :param groups: dict, group name -> list of zone IDs
+        :return: dict, setting ID -> {group name: {JSON-encoded value: zone count}}, only for
+                 settings whose most common value isn't the same in all groups; a group where
+                 several values are equally common has none, which counts as drift
+        """
+        groups = dict((name, [z for z in zone_ids if z in self._zone_rows]) for name, zone_ids in groups.items())
+        report = {}
+        for setting in self.settings:
+            counts = dict((name, self.value_counts(zone_ids, setting)) for name, zone_ids in groups.items())
+            leaders = set()
+            for c in counts.values():
+                if c:
+                    top = max(c.values())
+                    leaders.add(frozenset(value for value, n in c.items() if n == top))
+            if len(leaders) > 1 or any(len(values) > 1 for values in leaders):
+                report[setting] = counts
+        return report
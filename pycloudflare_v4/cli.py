@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+Command line interface: cfv4 <command> [zones...]
+
+Every command prints one JSON document per line and flushes after each one, so the output
+can be piped into jq or another process as results arrive. Commands that take zones run
+them in parallel; the api module (and requests) is imported only once a command runs.
+"""
+
+import argparse
+import errno
+import json
+import os
+import re
+import sys
+
+zone_id_re = re.compile(r'^[0-9a-f]{32}$')
+
+
+def emit(obj):
+    sys.stdout.write(json.dumps(obj, sort_keys=True) + "\n")
+    sys.stdout.flush()
+
+
+def get_client(args):
+    from pycloudflare_v4 import api
+
+    if not args.email or not args.key:
+        sys.stderr.write("cfv4: credentials are required, use --email/--key or CF_API_EMAIL/CF_API_KEY\n")
+        sys.exit(2)
+    return api.CloudFlare(args.email, args.key)
+
+
+def resolve_zones(cfapi, names):
+    """
+    Maps zone names (or IDs) to zone IDs. Zone listing is skipped if only IDs were given.
+    :return: list of (zone name or ID as given, zone ID)
+    """
+    if names and all(zone_id_re.match(n) for n in names):
+        return [(n, n) for n in names]
+    zones = cfapi.get_zones()
+    if not names:
+        return [(name, z['id']) for name, z in sorted(zones.items())]
+    resolved = []
+    for n in names:
+        if zone_id_re.match(n):
+            resolved.append((n, n))
+        elif n in zones:
+            resolved.append((n, zones[n]['id']))
+        else:
+            emit({"zone": n, "error": "zone not found"})
+    return resolved
+
+
+def run_per_zone(args, func):
+    """
+    Runs func(cfapi, zone_id) for every selected zone on a thread pool and emits its
+    output lines in completion order. With --dry-run nothing is written; a plan with the
+    number of calls and the estimated run time is emitted last.
+    :param func: returns a list of dicts to emit
+    :return: exit code
+    """
+    cfapi = get_client(args)
+    if not getattr(args, "dry_run", False):
+        return process_zones(args, cfapi, func)
+    with cfapi.dry_run() as plan:
+        code = process_zones(args, cfapi, func)
+    emit({"plan": plan.summary()})
+    return code
+
+
+def process_zones(args, cfapi, func):
+    from multiprocessing.pool import ThreadPool
+    from pycloudflare_v4.concurrency import BATCH
+
+    zones = resolve_zones(cfapi, args.zones)
+    failed = [len(zones) < len(args.zones)]
+
+    def work(zone):
+        name, zone_id = zone
+        try:
+            return [dict(line, zone=name) for line in func(cfapi, zone_id)]
+        except Exception as e:
+            failed[0] = True
+            return [{"zone": name, "error": str(e)}]
+
+    if not zones:
+        return 1 if failed[0] else 0
+    pool = ThreadPool(max(1, min(args.jobs, len(zones))))
+    try:
+        with cfapi.priority(BATCH):
+            work = cfapi.with_context(work)
+        for lines in pool.imap_unordered(work, zones):
+            for line in lines:
+                emit(line)
+    finally:
+        pool.close()
+        pool.join()
+    return 1 if failed[0] else 0
+
+
+def cmd_zones(args):
+    cfapi = get_client(args)
+    for name, zone in sorted(cfapi.get_zones().items()):
+        emit(zone)
+    return 0
+
+
+def cmd_records(args):
+    def records(cfapi, zone_id):
+        if args.name or args.type or args.content:
+            return cfapi.find_dns_records(zone_id, name=args.name, type=args.type, content=args.content)
+        return cfapi.dns_records(zone_id)
+    return run_per_zone(args, records)
+
+
+def cmd_settings(args):
+    def settings(cfapi, zone_id):
+        return [{"settings": cfapi.get_all_zone_settings(zone_id)}]
+    return run_per_zone(args, settings)
+
+
+def cmd_purge(args):
+    def purge(cfapi, zone_id):
+        return [{"success": cfapi.purge_everything(zone_id)['success']}]
+    return run_per_zone(args, purge)
+
+
+def cmd_apply(args):
+    with open(args.file) as f:
+        wanted = json.load(f)
+
+    def apply_settings(cfapi, zone_id):
+        lines = []
+        for setting, value in sorted(wanted.items()):
+            uri = "zones/{0}/settings/{1}".format(zone_id, setting)
+            response = cfapi.api_call_patch(uri, {"value": value})
+            lines.append({"setting": setting, "value": value, "success": response['success'],
+                          "errors": response['errors']})
+        return lines
+    return run_per_zone(args, apply_settings)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="cfv4", description="CloudFlare API v4 command line client.")
+    parser.add_argument("--email", default=os.environ.get("CF_API_EMAIL"), help="default: $CF_API_EMAIL")
+    parser.add_argument("--key", default=os.environ.get("CF_API_KEY"), help="default: $CF_API_KEY")
+    parser.add_argument("-j", "--jobs", type=int, default=8, help="zones processed in parallel (default: 8)")
+    commands = parser.add_subparsers(dest="command")
+    commands.required = True
+
+    p = commands.add_parser("zones", help="list zones")
+    p.set_defaults(func=cmd_zones)
+
+    p = commands.add_parser("records", help="list DNS records")
+    p.add_argument("zones", nargs="*", help="zone names or IDs, all zones if omitted")
+    p.add_argument("--name")
+    p.add_argument("--type")
+    p.add_argument("--content")
+    p.set_defaults(func=cmd_records)
+
+    p = commands.add_parser("settings", help="get all zone settings")
+    p.add_argument("zones", nargs="*", help="zone names or IDs, all zones if omitted")
+    p.set_defaults(func=cmd_settings)
+
+    p = commands.add_parser("purge", help="purge everything from cache")
+    p.add_argument("zones", nargs="+", help="zone names or IDs")
+    p.add_argument("--dry-run", action="store_true", help="count calls and estimate time, change nothing")
+    p.set_defaults(func=cmd_purge)
+
+    p = commands.add_parser("apply", help='apply settings from a JSON file, e.g. {"ssl": "full"}')
+    p.add_argument("file")
+    p.add_argument("zones", nargs="*", help="zone names or IDs, all zones if omitted")
+    p.add_argument("--dry-run", action="store_true", help="count calls and estimate time, change nothing")
+    p.set_defaults(func=cmd_apply)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    try:
+        return args.func(args)
+    except KeyboardInterrupt:
+        return 130
+    except IOError as e:
+        if e.errno == errno.EPIPE:  # output piped into head and friends
+            return 0
+        raise
+
+
+if __name__ == '__main__':
+    sys.exit(main())
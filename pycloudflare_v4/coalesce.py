@@ -0,0 +1,146 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import atexit
+import threading
+import time
+
+from pycloudflare_v4.concurrency import INTERACTIVE
+
+
+class PendingWrite(object):
+    """
+    Handle of a queued record change, shared by every change merged into the same write.
+    """
+    def __init__(self):
+        self.result = None
+        self.error = None
+        self._done = threading.Event()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the write has been sent.
+        :return: the updated record
+        """
+        if not self._done.wait(timeout):
+            raise RuntimeError('write still pending after {0} seconds'.format(timeout))
+        if self.error is not None:
+            raise self.error
+        return self.result
+
+    def _finish(self, result=None, error=None):
+        self.result = result
+        self.error = error
+        self._done.set()
+
+
+class WriteQueue(object):
+    """
+    Coalesces DNS record updates. Changes to the same record that arrive within `window` seconds
+    of its first queued change are merged, later values winning, and sent as a single PATCH.
+    Records due at the same time are sent concurrently, as INTERACTIVE calls. Pending writes
+    are flushed on close() and at interpreter exit.
+
+        queue = WriteQueue(cfapi, window=0.5)
+        queue.update(zone_id, record_id, content="192.0.2.10")
+        queue.update(zone_id, record_id, content="192.0.2.11", proxied=True).wait()
+    """
+    def __init__(self, cfapi, window=0.5):
+        self.cfapi = cfapi
+        self.window = window
+        self._pending = {}
+        self._cond = threading.Condition()
+        self._closed = False
+        self._sending = 0
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def update(self, zone_id, record_id, **changes):
+        """
+        Queues changes of a record, e.g. content="192.0.2.1", proxied=True, ttl=120.
+        Inside cfapi.dry_run() the change isn't queued but counted in the plan right away, since
+        the queue's thread doesn't run in the caller's dry run.
+        :return: PendingWrite
+        """
+        with self._cond:
+            if self._closed:
+                raise RuntimeError('WriteQueue is closed')
+            if self.cfapi.plan is None:
+                key = (zone_id, record_id)
+                if key not in self._pending:
+                    self._pending[key] = [{}, time.time() + self.window, PendingWrite()]
+                    self._cond.notify_all()
+                self._pending[key][0].update(changes)
+                return self._pending[key][2]
+        pending = PendingWrite()
+        self._send(((zone_id, record_id), (dict(changes), 0, pending)))
+        return pending
+
+    def flush(self):
+        """
+        Sends everything queued now and blocks until it has been applied.
+        """
+        with self._cond:
+            for entry in self._pending.values():
+                entry[1] = 0
+            self._cond.notify_all()
+            while self._pending or self._sending:
+                self._cond.wait()
+
+    def close(self):
+        """
+        Stops taking changes, sends the pending ones and waits for them.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join()
+        if hasattr(atexit, "unregister"):  # Python 3 only
+            atexit.unregister(self.close)
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while True:
+                    now = time.time()
+                    #  once closed, everything still pending is due
+                    due = [key for key, entry in self._pending.items() if self._closed or entry[1] <= now]
+                    if due or self._closed:
+                        break
+                    if self._pending:
+                        self._cond.wait(min(entry[1] for entry in self._pending.values()) - now)
+                    else:
+                        self._cond.wait()
+                if not due:
+                    return
+                batch = [(key, self._pending.pop(key)) for key in due]
+                self._sending += len(batch)
+
+            try:
+                with self.cfapi.priority(INTERACTIVE):
+                    self.cfapi.parallel_map(self._send, batch)
+            finally:
+                with self._cond:
+                    self._sending -= len(batch)
+                    self._cond.notify_all()
+
+    def _send(self, item):
+        (zone_id, record_id), (changes, due, pending) = item
+        uri = "zones/" + str(zone_id) + "/dns_records/" + str(record_id)
+        try:
+            response = self.cfapi.api_call_patch(uri, changes)
+            if not response['success']:
+                raise self.cfapi.APIError(str(response['errors']))
+        except Exception as e:
+            pending._finish(error=e)
+            return
+        self.cfapi._index_record(zone_id, response['result'])
+        pending._finish(result=response['result'])
@@ -0,0 +1,254 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import itertools
+import threading
+import time
+
+INTERACTIVE = 0
+BATCH = 1
+
+
+class AdaptiveLimiter(object):
+    """
+    Bounds the number of in-flight API requests and tunes that bound with AIMD:
+    every successful, fast response adds roughly one slot per window, while a 429,
+    a 5xx, a connection error or a response slower than latency_target halves it.
+    Only one decrease is applied per congestion event: requests that were already
+    in flight when the limit was cut don't cut it again.
+
+    Free slots go to waiting requests in order of arrival, where a BATCH request counts as
+    arriving `aging` seconds after it really did: an INTERACTIVE request only waits for batch
+    requests that have waited `aging` seconds longer than it has, and batch work slows down
+    but never stops. Given a RateLimiter, acquire() takes the rate token in the same order,
+    so interactive requests also come first when the rate budget is the bottleneck.
+    """
+    def __init__(self, initial=4, minimum=1, maximum=16, increase=1.0, decrease=0.5, latency_target=2.0,
+                 aging=10.0):
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = float(increase)
+        self.decrease = float(decrease)
+        self.latency_target = latency_target
+        self.aging = aging
+        self.limit = float(max(minimum, min(initial, maximum)))
+        self.in_flight = 0
+        self.latency = None  # EWMA of response time, seconds
+        self._last_decrease = 0.0
+        self._waiters = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+    def _next_waiter(self):
+        return min(self._waiters, key=lambda w: (w[2] + (self.aging if w[0] == BATCH else 0), w[1]))
+
+    def acquire(self, priority=INTERACTIVE, rate_limiter=None):
+        """
+        Blocks until a slot is free, a rate token is available if rate_limiter is given, and
+        no more urgent request is waiting for either.
+        :param priority: INTERACTIVE or BATCH
+        :param rate_limiter: RateLimiter to take a token from once this request is next in line
+        :return: token to hand back to release()
+        """
+        with self._cond:
+            waiter = (priority, next(self._seq), time.time())
+            self._waiters.append(waiter)
+            try:
+                while True:
+                    if self.in_flight >= int(self.limit) or self._next_waiter() is not waiter:
+                        self._cond.wait()
+                        continue
+                    wait = 0 if rate_limiter is None else rate_limiter.try_acquire()
+                    if not wait:
+                        break
+                    self._cond.wait(wait)  # only the head of the line waits for the bucket
+            finally:
+                self._waiters.remove(waiter)
+            self.in_flight += 1
+            if self._waiters and self.in_flight < int(self.limit):
+                self._cond.notify_all()
+            return time.time()
+
+    def cancel(self):
+        """
+        Frees a slot taken by acquire() whose request was never sent; the limit is left as it is.
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self._cond.notify_all()
+
+    def release(self, token, status=None, error=False):
+        """
+        Frees the slot taken by acquire() and feeds the outcome back into the limit.
+        :param token: value returned by acquire()
+        :param status: HTTP status code of the response, if any
+        :param error: True if the request failed on the connection level
+        :return:
+        """
+        now = time.time()
+        elapsed = now - token
+        with self._cond:
+            self.in_flight -= 1
+            if not error:
+                if self.latency is None:
+                    self.latency = elapsed
+                else:
+                    self.latency = 0.8 * self.latency + 0.2 * elapsed
+
+            congested = error or status == 429 or (status is not None and status >= 500)
+            if congested or elapsed > self.latency_target:
+                if token > self._last_decrease:
+                    self.limit = max(float(self.minimum), self.limit * self.decrease)
+                    self._last_decrease = now
+            elif self.in_flight + 1 >= int(self.limit):
+                #  grow only while the limit is what holds requests back, not e.g. the rate budget
+                self.limit = min(float(self.maximum), self.limit + self.increase / self.limit)
+            self._cond.notify_all()
+
+
+class CircuitBreaker(object):
+    """
+    Fails fast while the API is degraded. After failure_threshold consecutive failures
+    the circuit opens and allow() returns False for reset_timeout seconds; then a single
+    trial request is let through, and its outcome closes or re-opens the circuit.
+    A caller that gets the trial but doesn't send it must hand it back with cancel_trial().
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._trial = None  # thread holding the half-open trial
+        self._lock = threading.Lock()
+
+    def allow(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.time() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial = None
+            if self.state == self.HALF_OPEN and self._trial is None:
+                self._trial = threading.current_thread()
+                return True
+            return False
+
+    def cancel_trial(self):
+        """
+        Gives back the trial taken by this thread if no outcome has been recorded for it,
+        so that the next call can try. Does nothing otherwise.
+        """
+        with self._lock:
+            if self.state == self.HALF_OPEN and self._trial is threading.current_thread():
+                self._trial = None
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.state = self.CLOSED
+            self._trial = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                self.state = self.OPEN
+                self._opened_at = time.time()
+                self._trial = None
+
+
+class RateLimiter(object):
+    """
+    Token bucket holding the request budget of one set of credentials,
+    by default CloudFlare's 1200 requests per 5 minutes. Bursts of up to `burst`
+    requests go out at once, after that requests are spaced evenly. The bucket refills
+    at (requests - burst) / period, so no window of `period` seconds, the first one
+    included, holds more than `requests` requests.
+    """
+    def __init__(self, requests=1200, period=300.0, burst=10):
+        self.burst = float(max(1, min(burst, requests - 1)))
+        self.rate = max(requests - self.burst, 1) / float(period)
+        self.tokens = self.burst
+        self._updated = time.time()
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """
+        Takes a token if one is available.
+        :return: 0 if a token was taken, otherwise seconds until the next one
+        """
+        with self._lock:
+            now = time.time()
+            self.tokens = min(self.burst, self.tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0
+            return (1 - self.tokens) / self.rate
+
+    def acquire(self):
+        """
+        Blocks until a request may be sent.
+        :return:
+        """
+        while True:
+            wait = self.try_acquire()
+            if not wait:
+                return
+            time.sleep(wait)
+
+
+class PageSizer(object):
+    """
+    Chooses per_page for paginated listings, per endpoint. Every page fetched updates the
+    endpoint's average seconds and bytes per item, and the next listing uses the largest page
+    expected to stay within latency_target and max_bytes, capped per endpoint. A page size
+    at most doubles from one listing to the next, and it is halved when a page times out or gets a 5xx.
+    The page size stays fixed within a listing, since page numbers depend on it.
+
+    latency_target must stay well below the AdaptiveLimiter's, which counts slower responses
+    as congestion. The client derives it from its limiter unless given a PageSizer.
+    """
+    caps = {"zones": 50, "dns_records": 5000}
+
+    def __init__(self, initial=None, caps=None, minimum=5, default_cap=1000, latency_target=1.0,
+                 max_bytes=4 * 1024 * 1024):
+        self.sizes = dict(initial or {"zones": 50, "dns_records": 100})
+        self.caps = dict(self.caps, **(caps or {}))
+        self.minimum = minimum
+        self.default_cap = default_cap
+        self.latency_target = latency_target
+        self.max_bytes = max_bytes
+        self._seconds_per_item = {}
+        self._bytes_per_item = {}
+        self._lock = threading.Lock()
+
+    def size(self, endpoint):
+        with self._lock:
+            return self.sizes.get(endpoint, min(100, self.caps.get(endpoint, self.default_cap)))
+
+    def observe(self, endpoint, items, size_bytes, seconds):
+        """
+        Feeds a fetched page back. Only full pages say something about the cost per item.
+        """
+        with self._lock:
+            current = self.sizes.get(endpoint, min(100, self.caps.get(endpoint, self.default_cap)))
+            if items < current:
+                return
+            for averages, value in ((self._seconds_per_item, seconds / items),
+                                    (self._bytes_per_item, float(size_bytes) / items)):
+                averages[endpoint] = value if endpoint not in averages else 0.7 * averages[endpoint] + 0.3 * value
+            best = min(self.latency_target / max(self._seconds_per_item[endpoint], 1e-6),
+                       self.max_bytes / max(self._bytes_per_item[endpoint], 1.0))
+            cap = self.caps.get(endpoint, self.default_cap)
+            self.sizes[endpoint] = int(max(self.minimum, min(cap, best, current * 2)))
+
+    def failed(self, endpoint):
+        with self._lock:
+            current = self.sizes.get(endpoint, min(100, self.caps.get(endpoint, self.default_cap)))
+            self.sizes[endpoint] = max(self.minimum, current // 2)
@@ -0,0 +1,111 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import json
+import multiprocessing
+import os
+
+from pycloudflare_v4.api import CloudFlare
+from pycloudflare_v4.concurrency import RateLimiter, BATCH
+
+_client = None
+
+
+def _init_worker(email, token, rate, period):
+    global _client
+    _client = CloudFlare(email, token, rate_limiter=RateLimiter(rate, period))
+
+
+def _crawl_zone(args):
+    """
+    Runs in a worker process: fetches one zone and writes it to <output_dir>/<zone_id>.json.
+    Errors are returned rather than raised so that one bad zone doesn't stop the crawl.
+    """
+    output_dir, zone = args
+    try:
+        with _client.priority(BATCH):
+            snapshot = {"zone": zone,
+                        "settings": _client.get_all_zone_settings(zone['id']),
+                        "dns_records": _client.dns_records(zone['id'])}
+        write_json(os.path.join(output_dir, zone['id'] + ".json"), snapshot)
+    except Exception as e:
+        return zone['id'], str(e)
+    return zone['id'], None
+
+
+def write_json(path, obj):
+    """
+    Writes obj to path atomically, readers see either the old or the new file.
+    """
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(obj, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp, path)
+
+
+class Crawler(object):
+    """
+    Snapshots every zone of an account, with its settings and DNS records, into output_dir.
+
+    Zones are sharded over worker processes, each with its own pooled client. Workers pull
+    the next zone from a shared queue as soon as they're done, so a few huge zones don't
+    leave the other workers idle. Every zone is written to its own file as soon as it's
+    done and recorded in output_dir/checkpoint; a restarted crawl skips zones recorded there.
+    The account's rate budget is split evenly between the workers.
+    """
+    def __init__(self, email, token, output_dir, workers=4, rate=1200, period=300.0):
+        self.email = email
+        self.token = token
+        self.output_dir = output_dir
+        self.workers = workers
+        self.rate = rate
+        self.period = period
+        self.checkpoint_path = os.path.join(output_dir, "checkpoint")
+
+    def completed(self):
+        """
+        :return: set of zone IDs recorded in the checkpoint file
+        """
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as f:
+            return set(line.strip() for line in f if line.strip())
+
+    def run(self, zones=None):
+        """
+        Crawls all zones, or just the given ones, skipping zones completed by an earlier run.
+        Delete the checkpoint file to start over.
+        :param zones: dict as returned by CloudFlare.get_zones(), listed if omitted
+        :return: dict with "done", "skipped" counts and "failed" - zone ID -> error
+        """
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir)
+        if zones is None:
+            zones = CloudFlare(self.email, self.token).get_zones()
+            write_json(os.path.join(self.output_dir, "zones.json"), zones)
+
+        completed = self.completed()
+        todo = [(self.output_dir, z) for name, z in sorted(zones.items()) if z['id'] not in completed]
+        summary = {"done": 0, "skipped": len(zones) - len(todo), "failed": {}}
+        if not todo:
+            return summary
+
+        workers = max(1, min(self.workers, len(todo)))
+        pool = multiprocessing.Pool(workers, _init_worker,
+                                    (self.email, self.token, float(self.rate) / workers, self.period))
+        try:
+            with open(self.checkpoint_path, "a") as checkpoint:
+                for zone_id, error in pool.imap_unordered(_crawl_zone, todo):
+                    if error is not None:
+                        summary["failed"][zone_id] = error
+                        continue
+                    checkpoint.write(zone_id + "\n")
+                    checkpoint.flush()
+                    os.fsync(checkpoint.fileno())
+                    summary["done"] += 1
+        finally:
+            pool.close()
+            pool.join()
+        return summary
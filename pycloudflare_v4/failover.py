@@ -0,0 +1,171 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import socket
+import threading
+import time
+
+import requests
+
+from pycloudflare_v4.concurrency import INTERACTIVE
+
+
+def tcp_probe(port=80, timeout=2.0):
+    """
+    :return: probe that is healthy if a TCP connection to the origin can be opened
+    """
+    def probe(origin):
+        try:
+            socket.create_connection((origin, port), timeout).close()
+        except (socket.error, socket.timeout):
+            return False
+        return True
+    return probe
+
+
+def http_probe(path="/", port=80, scheme="http", timeout=2.0, host=None, verify=False):
+    """
+    :param host: Host header to send, the origin address if None
+    :param verify: verify TLS certificates; off by default since origins are probed by address
+    :return: probe that is healthy if the origin answers the URL without a 5xx
+    """
+    def probe(origin):
+        url = "{0}://{1}:{2}{3}".format(scheme, origin, port, path)
+        headers = {"Host": host} if host else {}
+        try:
+            return requests.get(url, headers=headers, timeout=timeout, verify=verify).status_code < 500
+        except requests.RequestException:
+            return False
+    return probe
+
+
+class Failover(object):
+    """
+    Switches DNS records from failed origins to their backups and back.
+
+    Records are indexed by origin once, up front: every record in zone_ids whose content is one of
+    the primary origins. check() probes all primaries concurrently; an origin that fails `fall`
+    checks in a row has all its records switched to its backup at once, and an origin that passes
+    `rise` checks in a row while failed over is switched back. Switches are concurrent PATCHes that
+    must complete within latency_target seconds; records that miss it are retried on the next check.
+    Switches are sent as INTERACTIVE, ahead of any batch work on the client. The client's limiter still
+    bounds their concurrency, so give failover a client of its own with a large enough limiter.
+
+        failover = Failover(cfapi, [zone_id], {"192.0.2.10": "198.51.100.10"}, tcp_probe(443))
+        failover.start(interval=5)
+    """
+    def __init__(self, cfapi, zone_ids, origins, probe, fall=3, rise=5, latency_target=5.0, on_event=None):
+        """
+        :param cfapi: CloudFlare
+        :param zone_ids:
+        :param origins: dict, primary origin -> backup origin, as record content
+        :param probe: callable(origin) -> bool, see tcp_probe() and http_probe()
+        :param fall: failed checks in a row before failing over
+        :param rise: passed checks in a row before failing back
+        :param latency_target: seconds a switch may take
+        :param on_event: callable(origin, action, result), action is "failover" or "failback"
+        """
+        self.cfapi = cfapi
+        self.zone_ids = list(zone_ids)
+        self.origins = dict(origins)
+        self.probe = probe
+        self.fall = fall
+        self.rise = rise
+        self.latency_target = latency_target
+        self.on_event = on_event
+        self.failed = set()
+        self.records = {}
+        self._streak = dict((origin, 0) for origin in self.origins)
+        self._unswitched = {}
+        self._stop = threading.Event()
+        self._thread = None
+        self.reindex()
+
+    def reindex(self):
+        """
+        Rebuilds the origin -> records map from the zones' RecordIndexes. Records are found by
+        their primary origin, so only reindex while no origin is failed over.
+        """
+        self.records = dict((origin, []) for origin in self.origins)
+        for zone_id in self.zone_ids:
+            index = self.cfapi.indexes.get(zone_id) or self.cfapi.dns_index(zone_id)
+            for origin in self.origins:
+                self.records[origin].extend((zone_id, r['id']) for r in index.find(content=origin))
+
+    def check(self):
+        """
+        Probes every primary origin once and fails over or back as needed.
+        """
+        def probe(origin):
+            try:
+                return bool(self.probe(origin))
+            except Exception:
+                return False
+
+        origins = sorted(self.origins)
+        with self.cfapi.priority(INTERACTIVE):
+            probed = self.cfapi.parallel_map(probe, origins)
+        for origin, healthy in zip(origins, probed):
+            if healthy == (origin in self.failed):
+                self._streak[origin] += 1
+            else:
+                self._streak[origin] = 0
+
+            if origin not in self.failed and self._streak[origin] >= self.fall:
+                self.failed.add(origin)
+                self._streak[origin] = 0
+                self._switch(origin, self.records[origin], self.origins[origin], "failover")
+            elif origin in self.failed and self._streak[origin] >= self.rise:
+                self.failed.discard(origin)
+                self._streak[origin] = 0
+                self._switch(origin, self.records[origin], origin, "failback")
+            elif self._unswitched.get(origin):
+                target = self.origins[origin] if origin in self.failed else origin
+                action = "failover" if origin in self.failed else "failback"
+                self._switch(origin, self._unswitched[origin], target, action)
+
+    def _switch(self, origin, records, content, action):
+        expires = time.time() + self.latency_target
+
+        def patch(record):
+            zone_id, record_id = record
+            uri = "zones/" + str(zone_id) + "/dns_records/" + str(record_id)
+            try:
+                response = self.cfapi.api_call_patch(uri, {"content": content}, expires=expires)
+            except (self.cfapi.CONNError, self.cfapi.APIError) as e:
+                return record, str(e)
+            if not response['success']:
+                return record, str(response['errors'])
+            self.cfapi._index_record(zone_id, response['result'])
+            return record, None
+
+        started = time.time()
+        with self.cfapi.priority(INTERACTIVE):
+            results = self.cfapi.parallel_map(patch, records)
+        self._unswitched[origin] = [record for record, error in results if error is not None]
+        result = {"content": content,
+                  "switched": len(records) - len(self._unswitched[origin]),
+                  "failed": dict(((z, r), error) for (z, r), error in results if error is not None),
+                  "seconds": time.time() - started}
+        if self.on_event is not None:
+            self.on_event(origin, action, result)
+        return result
+
+    def start(self, interval=5.0):
+        """
+        Runs check() every `interval` seconds on a background thread.
+        """
+        def run():
+            while not self._stop.is_set():
+                self.check()
+                self._stop.wait(interval)
+
+        self._stop.clear()
+        self._thread = threading.Thread(target=run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import bisect
+import threading
+
+
+def reversed_name(name):
+    """
+    "www.api.example.com" -> "com.example.api.www." so that all names under a domain
+    share a string prefix and sit next to each other in a sorted list.
+    """
+    return ".".join(reversed(name.lower().rstrip(".").split("."))) + "."
+
+
+class RecordIndex(object):
+    """
+    Hash indexes over a zone's DNS records by name, type, content and proxied status, plus a
+    sorted list of reversed names for suffix lookups. Build it from dns_records(), or get one
+    kept up to date by the client with CloudFlare.dns_index().
+    """
+    keys = ("name", "type", "content", "proxied")
+
+    def __init__(self, records=()):
+        self.records = {}
+        self._indexes = dict((key, {}) for key in self.keys)
+        self._names = []
+        self._lock = threading.RLock()
+        for record in records:
+            self.add(record)
+
+    def _key(self, key, value):
+        if key == "name":
+            return value.lower().rstrip(".")
+        if key == "proxied":
+            return str(value).lower() == "true"
+        return value
+
+    def add(self, record):
+        """
+        Adds a record, or replaces the record with the same ID.
+        """
+        with self._lock:
+            if record['id'] in self.records:
+                self.remove(record['id'])
+            self.records[record['id']] = record
+            for key in self.keys:
+                if key in record:
+                    ids = self._indexes[key].setdefault(self._key(key, record[key]), set())
+                    ids.add(record['id'])
+                    if key == "name" and len(ids) == 1:
+                        bisect.insort(self._names, reversed_name(record['name']))
+
+    def remove(self, record_id):
+        with self._lock:
+            record = self.records.pop(record_id, None)
+            if record is None:
+                return
+            for key in self.keys:
+                if key not in record:
+                    continue
+                value = self._key(key, record[key])
+                ids = self._indexes[key][value]
+                ids.discard(record_id)
+                if not ids:
+                    del self._indexes[key][value]
+                    if key == "name":
+                        self._names.remove(reversed_name(record['name']))
+
+    def get(self, record_id):
+        return self.records.get(record_id)
+
+    def find(self, **criteria):
+        """
+        Records matching all criteria, e.g. find(name="www.example.com", type="A").
+        :param criteria: any of name, type, content, proxied
+        :return: list
+        """
+        with self._lock:
+            matches = None
+            for key, value in criteria.items():
+                if key not in self._indexes:
+                    raise KeyError('valid keys: {0}'.format(list(self.keys)))
+                ids = self._indexes[key].get(self._key(key, value), set())
+                matches = set(ids) if matches is None else matches & ids
+                if not matches:
+                    return []
+            if matches is None:
+                return list(self.records.values())
+            return [self.records[record_id] for record_id in matches]
+
+    def under(self, domain):
+        """
+        Records under a domain: under("api.example.com") or under("*.api.example.com") returns
+        www.api.example.com and a.b.api.example.com, but not api.example.com itself.
+        :param domain:
+        :return: list
+        """
+        if domain.startswith("*."):
+            domain = domain[2:]
+        prefix = reversed_name(domain)
+        with self._lock:
+            i = bisect.bisect_right(self._names, prefix)
+            records = []
+            while i < len(self._names) and self._names[i].startswith(prefix):
+                name = ".".join(reversed(self._names[i].rstrip(".").split(".")))
+                records.extend(self.records[record_id] for record_id in self._indexes["name"][name])
+                i += 1
+            return records
+
+    def __len__(self):
+        return len(self.records)
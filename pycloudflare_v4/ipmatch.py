@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import binascii
+import bisect
+import socket
+import threading
+import time
+
+
+def ip_to_int(ip):
+    """
+    :param ip: IPv4 or IPv6 address as a string
+    :return: (version, integer value)
+    """
+    family, version = (socket.AF_INET6, 6) if ':' in ip else (socket.AF_INET, 4)
+    return version, int(binascii.hexlify(socket.inet_pton(family, ip)), 16)
+
+
+def cidr_to_interval(cidr):
+    """
+    :param cidr: e.g. "173.245.48.0/20"
+    :return: (version, first address, last address) as integers
+    """
+    address, prefix = cidr.split('/')
+    version, start = ip_to_int(address)
+    host_bits = (32 if version == 4 else 128) - int(prefix)
+    start = start >> host_bits << host_bits
+    return version, start, start + (1 << host_bits) - 1
+
+
+class CloudFlareIPs(object):
+    """
+    Answers "is this address CloudFlare's?" from the ranges returned by cf_ips().
+
+    Ranges are kept as sorted, merged intervals per address family, so a lookup is a
+    binary search. The ranges are fetched again once they are older than ttl; if that
+    fails, the old ranges stay in use and the refresh is retried after retry seconds.
+    Starts and ends are replaced together, as one (starts, ends) tuple, so lookups running
+    during a refresh see either the old ranges or the new ones.
+    """
+    def __init__(self, cfapi, ttl=86400, retry=60):
+        self.cfapi = cfapi
+        self.ttl = ttl
+        self.retry = retry
+        self.ranges = ({4: [], 6: []}, {4: [], 6: []})  # (starts, ends) per address family
+        self._expires = 0
+        self._lock = threading.Lock()
+
+    def refresh(self):
+        ips = self.cfapi.cf_ips()
+        intervals = {4: [], 6: []}
+        for cidr in ips['ipv4_cidrs'] + ips['ipv6_cidrs']:
+            version, start, end = cidr_to_interval(cidr)
+            intervals[version].append((start, end))
+
+        starts, ends = {}, {}
+        for version, ranges in intervals.items():
+            starts[version], ends[version] = [], []
+            for start, end in sorted(ranges):
+                if ends[version] and start <= ends[version][-1] + 1:
+                    ends[version][-1] = max(ends[version][-1], end)
+                else:
+                    starts[version].append(start)
+                    ends[version].append(end)
+        self.ranges = (starts, ends)
+        self._expires = time.time() + self.ttl
+
+    def _ensure_fresh(self):
+        if time.time() < self._expires:
+            return
+        with self._lock:
+            if time.time() < self._expires:
+                return
+            try:
+                self.refresh()
+            except Exception:
+                starts, ends = self.ranges
+                if not starts[4] and not starts[6]:
+                    raise
+                self._expires = time.time() + self.retry
+
+    def __contains__(self, ip):
+        self._ensure_fresh()
+        version, value = ip_to_int(ip)
+        starts, ends = self.ranges
+        starts, ends = starts[version], ends[version]
+        i = bisect.bisect_right(starts, value) - 1
+        return i >= 0 and value <= ends[i]
+
+    def classify(self, ips):
+        """
+        Vectorized lookup of IPv4 addresses given as integers, e.g. parsed from access logs. Needs NumPy.
+        :param ips: array-like of IPv4 addresses as unsigned integers
+        :return: numpy array of bool
+        """
+        import numpy
+
+        self._ensure_fresh()
+        ips = numpy.asarray(ips, dtype=numpy.uint32)
+        starts, ends = self.ranges
+        starts = numpy.array(starts[4], dtype=numpy.uint32)
+        ends = numpy.array(ends[4], dtype=numpy.uint32)
+        if not len(starts):
+            return numpy.zeros(ips.shape, dtype=bool)
+        i = numpy.searchsorted(starts, ips, side='right') - 1
+        return (i >= 0) & (ips <= ends[numpy.maximum(i, 0)])
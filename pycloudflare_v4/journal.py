@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import json
+import os
+import threading
+
+
+class Journal(object):
+    """
+    Append-only write-ahead journal for bulk operations, one JSON document per line:
+
+        {"seq": 1, "event": "intent", "operation": {...}}
+        {"seq": 1, "event": "done", "result": {...}}
+        {"seq": 2, "event": "failed", "error": "..."}
+
+    Intents of a whole batch are written before anything is sent, outcomes as they
+    arrive; every write is fsynced. Opening an existing journal replays it, and
+    pending() returns the operations that never finished. A half-written last line
+    left by a crash is ignored.
+
+    An operation that was sent but whose outcome wasn't journaled before the crash is
+    pending as well and will be sent again on resume.
+    """
+    def __init__(self, path, sync=True):
+        self.path = path
+        self.sync = sync
+        self.operations = {}
+        self.results = {}
+        self.errors = {}
+        self._seq = 0
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            self._load()
+        self._file = open(path, "a")
+
+    def _load(self):
+        with open(self.path, "rb+") as f:
+            data = f.read()
+            if data and not data.endswith(b"\n"):
+                f.truncate(data.rfind(b"\n") + 1)  # drop a torn last line before appending
+        for line in data.decode("utf-8").splitlines(True):
+            if not line.endswith("\n"):
+                break
+            try:
+                entry = json.loads(line)
+            except ValueError:
+                continue
+            seq = entry['seq']
+            self._seq = max(self._seq, seq)
+            if entry['event'] == 'intent':
+                self.operations[seq] = entry['operation']
+            elif entry['event'] == 'done':
+                self.results[seq] = entry['result']
+                self.errors.pop(seq, None)
+            elif entry['event'] == 'failed':
+                self.errors[seq] = entry['error']
+
+    def _write(self, entries):
+        with self._lock:
+            for entry in entries:
+                self._file.write(json.dumps(entry) + "\n")
+            self._file.flush()
+            if self.sync:
+                os.fsync(self._file.fileno())
+
+    def intents(self, operations):
+        """
+        Records a batch of operations before any of them is sent.
+        :param operations: list of JSON-serializable operations
+        :return: list of (seq, operation)
+        """
+        with self._lock:
+            first = self._seq + 1
+            self._seq += len(operations)
+        entries = list(zip(range(first, first + len(operations)), operations))
+        self._write([{"seq": seq, "event": "intent", "operation": operation} for seq, operation in entries])
+        for seq, operation in entries:
+            self.operations[seq] = operation
+        return entries
+
+    def done(self, seq, result):
+        self._write([{"seq": seq, "event": "done", "result": result}])
+        self.results[seq] = result
+        self.errors.pop(seq, None)
+
+    def failed(self, seq, error):
+        self._write([{"seq": seq, "event": "failed", "error": error}])
+        self.errors[seq] = error
+
+    def pending(self):
+        """
+        :return: list of (seq, operation) that haven't completed successfully, in journal order
+        """
+        return [(seq, self.operations[seq]) for seq in sorted(self.operations) if seq not in self.results]
+
+    def close(self):
+        self._file.close()
@@ -0,0 +1,60 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import math
+
+default_latency = 0.5  # seconds per call when nothing has been observed yet
+
+
+class Plan(object):
+    """
+    Calls counted by CloudFlare.dry_run(). Reads are sent as usual, since pagination can't be
+    known without them; writes are only counted. estimate() turns the count into run time
+    under the client's rate budget and observed latency.
+    """
+    def __init__(self):
+        self.calls = []
+        self.latency = None
+        self.concurrency = 1
+        self.rate = None
+        self.tokens = None
+
+    def record(self, method, uri):
+        self.calls.append((method, uri))
+
+    def observe(self, cfapi):
+        """
+        Takes latency, concurrency and rate budget of the client as they are now.
+        """
+        self.latency = cfapi.limiter.latency
+        self.concurrency = max(1, int(cfapi.limiter.limit))
+        if cfapi.rate_limiter is not None:
+            self.rate = cfapi.rate_limiter.rate
+            self.tokens = cfapi.rate_limiter.tokens
+
+    @property
+    def reads(self):
+        return sum(1 for method, uri in self.calls if method == 'GET')
+
+    @property
+    def writes(self):
+        return len(self.calls) - self.reads
+
+    def estimate(self):
+        """
+        :return: estimated run time in seconds: the longer of what the rate budget allows
+                 and what latency at the current concurrency allows
+        """
+        calls = len(self.calls)
+        latency = self.latency if self.latency is not None else default_latency
+        seconds = math.ceil(float(calls) / self.concurrency) * latency
+        if self.rate:
+            seconds = max(seconds, max(0, calls - int(self.tokens or 0)) / self.rate)
+        return seconds
+
+    def summary(self):
+        methods = {}
+        for method, uri in self.calls:
+            methods[method] = methods.get(method, 0) + 1
+        return {"calls": len(self.calls), "reads": self.reads, "writes": self.writes,
+                "methods": methods, "estimated_seconds": round(self.estimate(), 1)}
@@ -0,0 +1,95 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import functools
+import threading
+from multiprocessing.pool import ThreadPool
+
+from pycloudflare_v4.api import CloudFlare
+from pycloudflare_v4.concurrency import RateLimiter, BATCH
+
+
+class ClientPool(object):
+    """
+    Holds one CloudFlare client per account and routes every zone to the account owning it.
+    Each client has its own rate budget and concurrency limiter, so fleet-wide operations
+    get the combined throughput of all accounts.
+    """
+    def __init__(self, credentials, rate=1200, period=300.0):
+        """
+        :param credentials: list of (email, token) pairs
+        :param rate: requests allowed per account in `period` seconds
+        :param period:
+        """
+        self.clients = [CloudFlare(email, token, rate_limiter=RateLimiter(rate, period))
+                        for email, token in credentials]
+        self.zones = {}
+        self._owners = {}
+        self._lock = threading.Lock()
+
+    def get_zones(self):
+        """
+        Lists zones of all accounts concurrently and remembers which account owns each zone.
+        :return: dict, zone name -> zone, same as CloudFlare.get_zones()
+        """
+        pool = ThreadPool(max(1, len(self.clients)))
+        try:
+            listings = pool.map(lambda client: client.get_zones(), self.clients)
+        finally:
+            pool.close()
+            pool.join()
+
+        with self._lock:
+            for client, zones in zip(self.clients, listings):
+                for name, zone in zones.items():
+                    self.zones[name] = zone
+                    self._owners[zone['id']] = client
+            return dict(self.zones)
+
+    def client_for(self, zone_id):
+        """
+        Returns the client of the account owning the zone. Zones are listed on first use.
+        :param zone_id:
+        :return: CloudFlare
+        """
+        if zone_id not in self._owners:
+            self.get_zones()
+        try:
+            return self._owners[zone_id]
+        except KeyError:
+            raise CloudFlare.WRAPPERError('zone {0} is not owned by any account in the pool'.format(zone_id))
+
+    def map_zones(self, func, zone_ids):
+        """
+        Runs func(client, zone_id) for every zone with the owning account's client, as BATCH work.
+        Every account works through its own zones on its own threads, so a throttled account doesn't
+        hold up the others.
+        :param func:
+        :param zone_ids:
+        :return: list of results, in zone_ids order
+        """
+        zone_ids = list(zone_ids)
+        by_client = {}
+        for zone_id in zone_ids:
+            by_client.setdefault(self.client_for(zone_id), []).append(zone_id)
+
+        pending = []
+        for client, ids in by_client.items():
+            pool = ThreadPool(min(len(ids), client.limiter.maximum))
+            work = functools.partial(self._run_batch, func, client)
+            pending.append((pool, ids, pool.map_async(work, ids)))
+
+        results = {}
+        try:
+            for pool, ids, async_result in pending:
+                results.update(zip(ids, async_result.get()))
+        finally:
+            for pool, ids, async_result in pending:
+                pool.close()
+                pool.join()
+        return [results[zone_id] for zone_id in zone_ids]
+
+    @staticmethod
+    def _run_batch(func, client, zone_id):
+        with client.priority(BATCH):
+            return func(client, zone_id)
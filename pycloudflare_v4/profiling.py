@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import threading
+import time
+
+from requests.adapters import HTTPAdapter
+from requests.packages.urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+try:
+    import tracemalloc
+except ImportError:
+    tracemalloc = None
+
+phases = ("connect", "wait", "download", "decode", "post-process")
+
+_local = threading.local()
+
+
+def _timed(connection_class):
+    class TimedConnection(connection_class):
+        def connect(self):
+            start = time.time()
+            try:
+                return connection_class.connect(self)
+            finally:
+                _local.connect = getattr(_local, "connect", 0.0) + time.time() - start
+    return TimedConnection
+
+
+class TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _timed(HTTPConnectionPool.ConnectionCls)
+
+
+class TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _timed(HTTPSConnectionPool.ConnectionCls)
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """
+    HTTPAdapter whose connections note how long connecting (TCP and TLS) took, see take_connect_time().
+    """
+    def init_poolmanager(self, *args, **kwargs):
+        HTTPAdapter.init_poolmanager(self, *args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {"http": TimedHTTPConnectionPool,
+                                                   "https": TimedHTTPSConnectionPool}
+
+
+def take_connect_time():
+    """
+    :return: seconds this thread spent connecting since the last call
+    """
+    seconds = getattr(_local, "connect", 0.0)
+    _local.connect = 0.0
+    return seconds
+
+
+class Operation(object):
+    def __init__(self, name):
+        self.name = name
+        self.phases = dict((phase, 0.0) for phase in phases)
+        self.requests = 0
+        self.wall = None
+        self.peak_bytes = None
+        self._started = time.time()
+
+
+class Profiler(object):
+    """
+    Collects, per named operation, wall time, time per phase of the requests made meanwhile
+    and, where tracemalloc is available, the peak of memory allocated.
+
+    Phase times are summed over all requests of the operation, so with concurrent requests
+    they add up to more than the wall time. Requests are attributed to every operation running
+    at the time, whichever thread made them.
+    """
+    def __init__(self, trace_memory=True):
+        self.trace_memory = trace_memory and tracemalloc is not None
+        self.operations = []
+        self._active = []
+        self._started_tracing = False
+        self._lock = threading.Lock()
+
+    def start(self, name):
+        op = Operation(name)
+        with self._lock:
+            if self.trace_memory:
+                if not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    self._started_tracing = True
+                if hasattr(tracemalloc, "reset_peak"):
+                    tracemalloc.reset_peak()
+                op._memory_start = tracemalloc.get_traced_memory()[0]
+            self._active.append(op)
+        return op
+
+    def finish(self, op):
+        with self._lock:
+            op.wall = time.time() - op._started
+            if self.trace_memory:
+                op.peak_bytes = max(0, tracemalloc.get_traced_memory()[1] - op._memory_start)
+            self._active.remove(op)
+            self.operations.append(op)
+            if self._started_tracing and not self._active:
+                tracemalloc.stop()
+                self._started_tracing = False
+
+    def record(self, phase, seconds, request=False):
+        with self._lock:
+            for op in self._active:
+                op.phases[phase] += seconds
+                if request:
+                    op.requests += 1
+
+    def report(self):
+        """
+        :return: plain text table, one row per finished operation
+        """
+        header = ["operation", "wall s", "requests"] + [p + " s" for p in phases] + ["peak KiB"]
+        rows = [header]
+        for op in self.operations:
+            rows.append([op.name, "%.3f" % op.wall, str(op.requests)] +
+                        ["%.3f" % op.phases[p] for p in phases] +
+                        ["-" if op.peak_bytes is None else str(op.peak_bytes // 1024)])
+        widths = [max(len(row[i]) for row in rows) for i in range(len(header))]
+        return "\n".join("  ".join(cell.ljust(w) for cell, w in zip(row, widths)).rstrip() for row in rows)
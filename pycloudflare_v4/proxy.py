@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+"""
+cfv4-proxy: a local read-through caching proxy that speaks the CloudFlare v4 API.
+
+Reads of zones, DNS records, zone settings and CloudFlare IPs are answered from a cache that
+is refreshed by one request at a time per entry, unless their query has parameters the cache
+can't answer (e.g. order); every other request, writes included, is sent upstream through a
+single rate-limited, pooled client. Point existing clients at it with
+CloudFlare(email, token, base_url="http://127.0.0.1:8780/client/v4/"). Requests are made with the
+proxy's own credentials whatever the clients send, so keep it on a loopback address.
+"""
+
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+    from urlparse import urlparse, parse_qs
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+    from urllib.parse import urlparse, parse_qs
+
+from pycloudflare_v4.api import CloudFlare
+from pycloudflare_v4.concurrency import RateLimiter
+
+prefix = "/client/v4/"
+
+# query parameters the cache can answer, per endpoint; other queries are sent upstream
+cached_params = {"zones": {"name", "page", "per_page"},
+                 "dns_records": {"name", "type", "content", "proxied", "match", "page", "per_page"},
+                 "settings": set(),
+                 "ips": set()}
+
+
+class LocalCache(object):
+    """
+    In-process cache with single-flight refresh: of all threads finding an entry stale, one
+    refreshes it while the others get the stale value, or wait for it if there is none yet.
+    A refresh that an invalidate() overtook is returned to its caller but not stored.
+    """
+    def __init__(self, ttl=60):
+        self.ttl = ttl
+        self._entries = {}
+        self._locks = {}
+        self._generations = {}
+        self._lock = threading.Lock()
+
+    def _fresh(self, entry):
+        return entry is not None and time.time() - entry[1] < self.ttl
+
+    def get(self, key, loader):
+        entry = self._entries.get(key)
+        if self._fresh(entry):
+            return entry[0]
+        with self._lock:
+            key_lock = self._locks.setdefault(key, threading.Lock())
+        if entry is not None:
+            if not key_lock.acquire(False):
+                return entry[0]
+        else:
+            key_lock.acquire()
+        try:
+            entry = self._entries.get(key)
+            if self._fresh(entry):
+                return entry[0]
+            generation = self._generations.get(key, 0)
+            value = loader()
+            with self._lock:
+                if self._generations.get(key, 0) == generation:
+                    self._entries[key] = (value, time.time())
+            return value
+        finally:
+            key_lock.release()
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            self._entries.pop(key, None)
+
+
+def paginate_locally(items, query):
+    """
+    :return: (page of items, result_info) the way the API would paginate them
+    """
+    per_page = max(1, int(query.get("per_page", ["20"])[0]))
+    page = max(1, int(query.get("page", ["1"])[0]))
+    result = items[(page - 1) * per_page:page * per_page]
+    return result, {"page": page, "per_page": per_page, "count": len(result), "total_count": len(items),
+                    "total_pages": max(1, int(math.ceil(len(items) / float(per_page))))}
+
+
+def filter_records(records, query):
+    filters = [(key, query[key][0].lower()) for key in ("name", "type", "content", "proxied") if key in query]
+    if not filters:
+        return records
+    test = any if query.get("match", ["all"])[0] == "any" else all
+    return [r for r in records if test(str(r.get(key)).lower() == value for key, value in filters)]
+
+
+class ProxyHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    cfapi = None
+
+    def log_message(self, format, *args):
+        pass
+
+    def respond(self, status, body):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def cached_read(self, path, query):
+        """
+        :return: response body for the cached endpoints, None for anything else
+        """
+        endpoint = path.rsplit("/", 1)[-1]
+        if endpoint in cached_params and not set(query) <= cached_params[endpoint]:
+            return None
+        if path == "zones":
+            zones = sorted(self.cfapi.get_zones().values(), key=lambda z: z['name'])
+            if "name" in query:
+                zones = [z for z in zones if z['name'] == query["name"][0]]
+            result, info = paginate_locally(zones, query)
+        elif path == "ips":
+            result, info = self.cfapi.cf_ips(), None
+        else:
+            match = re.match(r'^zones/([^/]+)/(dns_records|settings)$', path)
+            if not match:
+                return None
+            zone_id, endpoint = match.groups()
+            if endpoint == "settings":
+                result = list(self.cfapi.get_all_zone_settings(zone_id).values())
+                info = None
+            else:
+                result, info = paginate_locally(filter_records(self.cfapi.all_dns_records(zone_id), query), query)
+        body = {"success": True, "errors": [], "messages": [], "result": result}
+        if info is not None:
+            body["result_info"] = info
+        return body
+
+    def handle_request(self, method):
+        url = urlparse(self.path)
+        if not url.path.startswith(prefix):
+            return self.respond(404, {"success": False, "errors": [{"message": "not found"}], "result": None})
+        path = url.path[len(prefix):].strip("/")
+        length = int(self.headers.get("Content-Length") or 0)
+        data = json.loads(self.rfile.read(length).decode("utf-8")) if length else None
+
+        try:
+            if method == "GET":
+                body = self.cached_read(path, parse_qs(url.query))
+                if body is not None:
+                    return self.respond(200, body)
+            uri = path + ("?" + url.query if url.query else "")
+            r = self.cfapi.api_call(method, uri, data)
+        except (CloudFlare.CONNError, CloudFlare.APIError) as e:
+            return self.respond(502, {"success": False, "errors": [{"message": str(e)}], "result": None})
+        self.respond(r.status_code, r.content)
+
+    def do_GET(self):
+        self.handle_request("GET")
+
+    def do_POST(self):
+        self.handle_request("POST")
+
+    def do_PUT(self):
+        self.handle_request("PUT")
+
+    def do_PATCH(self):
+        self.handle_request("PATCH")
+
+    def do_DELETE(self):
+        self.handle_request("DELETE")
+
+
+class ProxyServer(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+def make_server(cfapi, host="127.0.0.1", port=8780):
+    """
+    :param cfapi: CloudFlare client with a cache, used for every upstream request
+    :return: ProxyServer, call serve_forever() on it
+    """
+    handler = type("Handler", (ProxyHandler,), {"cfapi": cfapi})
+    return ProxyServer((host, port), handler)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="cfv4-proxy", description="Caching proxy for the CloudFlare API v4.")
+    parser.add_argument("--email", default=os.environ.get("CF_API_EMAIL"), help="default: $CF_API_EMAIL")
+    parser.add_argument("--key", default=os.environ.get("CF_API_KEY"), help="default: $CF_API_KEY")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8780)
+    parser.add_argument("--ttl", type=int, default=60, help="seconds reads are served from cache (default: 60)")
+    parser.add_argument("--rate", type=int, default=1200, help="upstream requests per 5 minutes (default: 1200)")
+    args = parser.parse_args(argv)
+    if not args.email or not args.key:
+        parser.error("credentials are required, use --email/--key or CF_API_EMAIL/CF_API_KEY")
+
+    cfapi = CloudFlare(args.email, args.key, rate_limiter=RateLimiter(args.rate, 300), cache=LocalCache(args.ttl))
+    server = make_server(cfapi, args.host, args.port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
@@ -0,0 +1,157 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import contextlib
+import errno
+import fcntl
+import json
+import os
+import re
+import stat
+import tempfile
+import threading
+import time
+
+
+def default_directory():
+    """
+    Per-user directory in /dev/shm when available, so entries live in shared memory rather than on disk.
+    """
+    base = "/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir()
+    return os.path.join(base, "pycloudflare-v4-{0}".format(os.getuid()))
+
+
+class SharedCache(object):
+    """
+    Cache shared by all processes of a host, e.g. pre-fork gunicorn workers.
+
+    Every entry is a JSON file in `directory`, replaced atomically by rename. The files sit
+    in the page cache (in shared memory with the default /dev/shm directory), so all workers
+    read the same pages, and each process decodes an entry only when the file has changed
+    since its last read. When an entry is stale, one process takes the entry's lock and
+    refreshes it from the API; the others keep serving the stale value meanwhile and only
+    wait for the refresh if there is no value at all. invalidate() bumps the entry's generation,
+    and a refresh that started before that is returned to its caller but not stored.
+
+    Values returned are shared within the process, don't modify them.
+    """
+    def __init__(self, directory=None, ttl=300):
+        """
+        :param directory: where entries are kept, default_directory() if None; created with mode 0700
+        :param ttl: seconds an entry is served without refreshing it
+        """
+        self.directory = directory or default_directory()
+        self.ttl = ttl
+        self._decoded = {}
+        self._lock = threading.Lock()
+        if not os.path.isdir(self.directory):
+            try:
+                os.makedirs(self.directory, 0o700)
+            except OSError as e:
+                if e.errno != errno.EEXIST:
+                    raise
+        if directory is None:
+            self._check_private(self.directory)
+
+    @staticmethod
+    def _check_private(directory):
+        """
+        The default directory sits in a world-writable place: refuse it unless it's a real directory
+        of the current user that nobody else can write to.
+        """
+        st = os.lstat(directory)
+        if not stat.S_ISDIR(st.st_mode) or st.st_uid != os.getuid():
+            raise OSError(errno.EPERM, "{0} is not a directory owned by the current user".format(directory))
+        if st.st_mode & 0o077:
+            os.chmod(directory, 0o700)
+
+    def _path(self, key):
+        return os.path.join(self.directory, re.sub(r'[^A-Za-z0-9_.-]', '_', key))
+
+    def _read(self, key):
+        """
+        :return: (value, written at) or None
+        """
+        path = self._path(key)
+        try:
+            st = os.stat(path)
+        except OSError:
+            return None
+        version = (st.st_ino, st.st_mtime, st.st_size)
+        cached = self._decoded.get(key)
+        if cached is not None and cached[0] == version:
+            return cached[1], st.st_mtime
+        try:
+            with open(path, "rb") as f:
+                value = json.loads(f.read().decode("utf-8"))
+        except (IOError, OSError, ValueError):
+            return None
+        with self._lock:
+            self._decoded[key] = (version, value)
+        return value, st.st_mtime
+
+    def _write(self, key, value):
+        path = self._path(key)
+        fd, tmp = tempfile.mkstemp(dir=self.directory, prefix=".tmp-")
+        with os.fdopen(fd, "w") as f:
+            json.dump(value, f)
+        os.rename(tmp, path)
+
+    @contextlib.contextmanager
+    def _generation(self, key):
+        """
+        Locks the entry's generation file, yields it.
+        """
+        with open(self._path(key) + ".gen", "a+") as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                yield f
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def get(self, key, loader):
+        """
+        :param key:
+        :param loader: called without arguments to fetch the value when the entry is missing or stale
+        :return: value
+        """
+        entry = self._read(key)
+        if entry is not None and time.time() - entry[1] < self.ttl:
+            return entry[0]
+
+        with open(self._path(key) + ".lock", "a") as lock:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except (IOError, OSError):
+                if entry is not None:
+                    return entry[0]  # another process is refreshing, serve the stale value
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                entry = self._read(key)  # may have been refreshed while we waited
+                if entry is not None and time.time() - entry[1] < self.ttl:
+                    return entry[0]
+                with self._generation(key) as gen:
+                    generation = gen.read()
+                value = loader()
+                with self._generation(key) as gen:
+                    if gen.read() == generation:  # otherwise invalidated while loading, value may be stale
+                        self._write(key, value)
+                return value
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def invalidate(self, key):
+        with self._generation(key) as gen:
+            generation = int(gen.read() or 0) + 1
+            gen.seek(0)
+            gen.truncate()
+            gen.write(str(generation))
+            gen.flush()
+            try:
+                os.unlink(self._path(key))
+            except OSError as e:
+                if e.errno != errno.ENOENT:
+                    raise
+        with self._lock:
+            self._decoded.pop(key, None)
@@ -0,0 +1,94 @@
+#!/usr/bin/env python
+# -*- coding: UTF-8 -*-
+
+import codecs
+import json
+
+_decoder = json.JSONDecoder()
+_whitespace = ' \t\n\r'
+_delimiters = ',:]}' + _whitespace
+
+
+class StreamingEnvelope(object):
+    """
+    Incremental parser of a CloudFlare API response body:
+
+        {"result": [...], "result_info": {...}, "success": true, "errors": [], "messages": []}
+
+    Items of the top-level "result" array are yielded by items() as soon as each one has been
+    received, so only one item plus a read chunk is held in memory no matter how large the page
+    is. All other top-level keys end up in envelope once items() is exhausted.
+    """
+    def __init__(self, chunks):
+        """
+        :param chunks: iterable of bytes, e.g. response.iter_content(65536)
+        """
+        self.envelope = {}
+        self._chunks = iter(chunks)
+        self._text = codecs.getincrementaldecoder('utf-8')()
+        self._buf = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self):
+        if self._eof:
+            raise ValueError('Unexpected end of JSON document.')
+        if self._pos > 65536:
+            self._buf = self._buf[self._pos:]
+            self._pos = 0
+        try:
+            self._buf += self._text.decode(next(self._chunks))
+        except StopIteration:
+            self._buf += self._text.decode(b'', True)
+            self._eof = True
+
+    def _skip_whitespace(self):
+        while True:
+            while self._pos < len(self._buf) and self._buf[self._pos] in _whitespace:
+                self._pos += 1
+            if self._pos < len(self._buf):
+                return self._buf[self._pos]
+            self._fill()
+
+    def _expect(self, chars):
+        c = self._skip_whitespace()
+        if c not in chars:
+            raise ValueError('Expected one of {0!r} at offset {1}, got {2!r}.'.format(chars, self._pos, c))
+        self._pos += 1
+        return c
+
+    def _value(self):
+        self._skip_whitespace()
+        while True:
+            try:
+                value, end = _decoder.raw_decode(self._buf, self._pos)
+            except ValueError:
+                self._fill()
+                continue
+            if not self._eof and (end == len(self._buf) or self._buf[end] not in _delimiters):
+                self._fill()  # a number might continue in the next chunk, e.g. "12." + "5"
+                continue
+            self._pos = end
+            return value
+
+    def items(self):
+        self._expect('{')
+        if self._skip_whitespace() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._value()
+            self._expect(':')
+            if key == 'result' and self._skip_whitespace() == '[':
+                self._pos += 1
+                if self._skip_whitespace() == ']':
+                    self._pos += 1
+                else:
+                    while True:
+                        yield self._value()
+                        if self._expect(',]') == ']':
+                            break
+            else:
+                self.envelope[key] = self._value()
+            if self._expect(',}') == '}':
+                return
@@ -1,7 +1,6 @@
 #!/usr/bin/env python
 
-from distutils.core import setup
-from setuptools import find_packages
+from setuptools import setup, find_packages
 
 setup(
     name='pycloudflare-v4',
@@ -22,5 +21,12 @@ setup(
     ],
 
     keywords='CludFlare API v4 wrapper',
-    packages=find_packages(exclude=['contrib', 'docs', 'tests', 'build', 'dist'])
+    packages=find_packages(exclude=['contrib', 'docs', 'tests', 'build', 'dist']),
+
+    entry_points={
+        'console_scripts': [
+            'cfv4 = pycloudflare_v4.cli:main',
+            'cfv4-proxy = pycloudflare_v4.proxy:main',
+        ],
+    },
 )
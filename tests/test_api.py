@@ -0,0 +1,40 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from pycloudflare_v4.api import CloudFlare
+from pycloudflare_v4.journal import Journal
+
+
+class BulkTest(unittest.TestCase):
+    def setUp(self):
+        self.cfapi = CloudFlare("user@example.com", "token", base_url="http://127.0.0.1:9/client/v4/")
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_malformed_operation_is_rejected_before_journaling(self):
+        journal = Journal(os.path.join(self.directory, "journal"))
+        operations = [{"op": "delete", "zone_id": "z", "record_id": "r"},
+                      {"op": "delete", "zone_id": "z"}]
+        with self.assertRaises(CloudFlare.WRAPPERError):
+            self.cfapi.dns_records_bulk(operations, journal=journal)
+        self.assertEqual(list(journal.pending()), [])
+
+    def test_unknown_argument_is_rejected(self):
+        with self.assertRaises(CloudFlare.WRAPPERError):
+            self.cfapi.dns_records_bulk([{"op": "delete", "zone_id": "z", "record_id": "r", "ttl": 1}])
+
+    def test_failing_operation_is_reported_not_raised(self):
+        journal = Journal(os.path.join(self.directory, "journal"))
+        results = self.cfapi.dns_records_bulk([{"op": "update", "zone_id": "z", "record_id": "r", "ttl": "abc"}],
+                                              journal=journal)
+        self.assertEqual(len(results), 1)
+        self.assertIn("error", results[0])
+        self.assertEqual(len(list(journal.pending())), 1)  # failed operations are left to resume
+
+
+if __name__ == '__main__':
+    unittest.main()
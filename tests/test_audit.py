@@ -0,0 +1,25 @@
+import unittest
+
+from pycloudflare_v4.audit import SettingsMatrix
+
+
+class GroupDriftTest(unittest.TestCase):
+    def test_same_dominant_value_is_no_drift(self):
+        matrix = SettingsMatrix({"p1": {"ssl": "full"}, "p2": {"ssl": "full"}, "p3": {"ssl": "off"},
+                                 "s1": {"ssl": "full"}})
+        self.assertEqual(matrix.group_drift({"production": ["p1", "p2", "p3"], "staging": ["s1"]}), {})
+
+    def test_different_dominant_values_are_drift(self):
+        matrix = SettingsMatrix({"p1": {"ssl": "full"}, "s1": {"ssl": "off"}})
+        self.assertIn("ssl", matrix.group_drift({"production": ["p1"], "staging": ["s1"]}))
+
+    def test_tie_is_drift_whatever_the_order(self):
+        for values in (("full", "off"), ("off", "full")):
+            matrix = SettingsMatrix({"p1": {"ssl": values[0]}, "p2": {"ssl": values[1]},
+                                     "s1": {"ssl": "full"}})
+            report = matrix.group_drift({"production": ["p1", "p2"], "staging": ["s1"]})
+            self.assertEqual(report["ssl"]["production"], {'"full"': 1, '"off"': 1})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+
+from pycloudflare_v4.api import CloudFlare
+from pycloudflare_v4.coalesce import WriteQueue
+
+
+class WriteQueueTest(unittest.TestCase):
+    def setUp(self):
+        # nothing listens there: any request actually sent fails
+        self.cfapi = CloudFlare("user@example.com", "token", base_url="http://127.0.0.1:9/client/v4/")
+        self.queue = WriteQueue(self.cfapi, window=0.05)
+
+    def tearDown(self):
+        self.queue.close()
+
+    def test_dry_run_changes_are_planned_not_sent(self):
+        with self.cfapi.dry_run() as plan:
+            pending = self.queue.update("zone", "record", content="192.0.2.1")
+        self.assertEqual(pending.wait(1), {"content": "192.0.2.1"})
+        self.assertEqual(plan.summary()["writes"], 1)
+
+    def test_closed_queue_refuses_changes(self):
+        self.queue.close()
+        with self.assertRaises(RuntimeError):
+            self.queue.update("zone", "record", content="192.0.2.1")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,49 @@
+import threading
+import time
+import unittest
+
+from pycloudflare_v4.concurrency import AdaptiveLimiter, RateLimiter, BATCH, INTERACTIVE
+
+
+class PriorityUnderRateLimitTest(unittest.TestCase):
+    def test_interactive_ahead_of_batch_when_budget_is_saturated(self):
+        limiter = AdaptiveLimiter()
+        rate_limiter = RateLimiter(60, 10, burst=2)  # ~6 tokens per second
+        stop = threading.Event()
+
+        def batch():
+            while not stop.is_set():
+                token = limiter.acquire(BATCH, rate_limiter)
+                time.sleep(0.01)
+                limiter.release(token, status=200)
+
+        threads = [threading.Thread(target=batch) for _ in range(16)]
+        for t in threads:
+            t.daemon = True
+            t.start()
+        try:
+            time.sleep(1.5)
+            latencies = []
+            for _ in range(3):
+                started = time.time()
+                token = limiter.acquire(INTERACTIVE, rate_limiter)
+                latencies.append(time.time() - started)
+                limiter.release(token, status=200)
+                time.sleep(0.2)
+        finally:
+            stop.set()
+            for t in threads:
+                t.join()
+        # one or two token intervals, not the whole batch backlog
+        self.assertLess(max(latencies), 0.5)
+
+    def test_limit_does_not_grow_while_rate_bound(self):
+        limiter = AdaptiveLimiter(initial=4)
+        rate_limiter = RateLimiter(20, 1, burst=1)
+        for _ in range(10):
+            limiter.release(limiter.acquire(BATCH, rate_limiter), status=200)
+        self.assertEqual(limiter.limit, 4.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,60 @@
+import json
+import threading
+import unittest
+
+try:
+    from BaseHTTPServer import BaseHTTPRequestHandler, HTTPServer
+    from SocketServer import ThreadingMixIn
+except ImportError:
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+    from socketserver import ThreadingMixIn
+
+from pycloudflare_v4 import profiling
+from pycloudflare_v4.api import CloudFlare
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        data = json.dumps({"success": True, "errors": [], "messages": [], "result": []}).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class Server(ThreadingMixIn, HTTPServer):
+    daemon_threads = True
+
+
+class ProfilerTest(unittest.TestCase):
+    def setUp(self):
+        self.server = Server(("127.0.0.1", 0), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever)
+        self.thread.daemon = True
+        self.thread.start()
+        self.base_url = "http://127.0.0.1:{0}/client/v4/".format(self.server.server_address[1])
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_earlier_connect_time_is_not_charged(self):
+        cfapi = CloudFlare("user@example.com", "token", base_url=self.base_url)
+        cfapi.api_call_get("ips")  # opens the keep-alive connection, unprofiled
+        profiling._local.connect = 5.0  # as if this thread had spent a while connecting before
+        with cfapi.profile("reused connection") as op:
+            cfapi.api_call_get("ips")
+        cfapi.session.close()
+        self.assertEqual(op.requests, 1)
+        self.assertLess(op.phases["connect"], 1.0)
+
+
+if __name__ == '__main__':
+    unittest.main()
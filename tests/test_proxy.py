@@ -0,0 +1,30 @@
+import threading
+import time
+import unittest
+
+from pycloudflare_v4.proxy import LocalCache
+
+
+class LocalCacheTest(unittest.TestCase):
+    def test_refresh_overtaken_by_invalidate_is_not_stored(self):
+        cache = LocalCache(ttl=60)
+
+        def slow_loader():
+            time.sleep(0.2)
+            return "old"
+
+        t = threading.Thread(target=cache.get, args=("records", slow_loader))
+        t.start()
+        time.sleep(0.05)
+        cache.invalidate("records")
+        t.join()
+        self.assertEqual(cache.get("records", lambda: "new"), "new")
+
+    def test_fresh_entry_is_served_from_cache(self):
+        cache = LocalCache(ttl=60)
+        cache.get("ips", lambda: 1)
+        self.assertEqual(cache.get("ips", lambda: 2), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
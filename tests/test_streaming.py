@@ -0,0 +1,40 @@
+import json
+import unittest
+
+from pycloudflare_v4.streaming import StreamingEnvelope
+
+
+def chunked(data, size):
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+class StreamingEnvelopeTest(unittest.TestCase):
+    body = {"result": [{"id": "a", "ttl": 1, "weight": 12.5, "content": u"été \\\" ,]}"},
+                       12.5, -3e-7, 1E+21, 0, True, None, u"x y", [1, [2.25]], {}],
+            "result_info": {"page": 1, "total_pages": 1, "ratio": 0.125},
+            "success": True, "errors": [], "messages": []}
+
+    def test_every_chunk_size(self):
+        for separators in [(",", ":"), (", ", ": ")]:
+            data = json.dumps(self.body, separators=separators).encode("utf-8")
+            for size in range(1, len(data) + 1):
+                envelope = StreamingEnvelope(chunked(data, size))
+                items = list(envelope.items())
+                self.assertEqual(items, self.body["result"], "chunk size {0}".format(size))
+                self.assertEqual(envelope.envelope["result_info"], self.body["result_info"])
+                self.assertTrue(envelope.envelope["success"])
+
+    def test_empty_result(self):
+        envelope = StreamingEnvelope([b'{"result": [], "success": true}'])
+        self.assertEqual(list(envelope.items()), [])
+        self.assertTrue(envelope.envelope["success"])
+
+    def test_truncated_body(self):
+        data = json.dumps(self.body).encode("utf-8")[:-20]
+        for size in (1, 7, len(data)):
+            with self.assertRaises(ValueError):
+                list(StreamingEnvelope(chunked(data, size)).items())
+
+
+if __name__ == '__main__':
+    unittest.main()